@@ -1,9 +1,10 @@
-from .models import Currency, Item, Category, RankCategory, Tax, Discount, Cart, CartItem, Order, OrderItem
+from .models import Currency, Item, Category, RankCategory, Tax, Discount, Cart, CartItem, Order, OrderItem, StripeEvent, UserSpend
 from django.contrib import admin
 from .models import Item, Category, Tax, Discount, Cart, CartItem
-from django.utils.safestring import mark_safe
 from django.contrib import messages
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+from .images import picture_html
 
 
 @admin.register(Item)
@@ -19,13 +20,13 @@ class ItemAdmin(admin.ModelAdmin):
     @admin.display(description='Миниатюрное изображение')
     def item_image(self, item: Item):
         if item.image:
-            return mark_safe(f"<img src='{item.image.url}' width=50>")
+            return picture_html(item.image.url, item.image_variants, sizes="50px", width=50)
         return "Без фото"
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'slug')
+    list_display = ('name', 'slug', 'items_count')
     ordering = ('id',)
 
 
@@ -157,11 +158,11 @@ class CartItemAdmin(admin.ModelAdmin):
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     fields = ('user', 'stripe_session_id', 'stripe_payment_intent_id', 'status',
-              'total_amount', 'currency',
+              'total_amount', 'currency', 'amount_rub', 'paid_at',
               'created_at', 'updated_at')
 
     readonly_fields = ('user', 'stripe_session_id', 'stripe_payment_intent_id', 'status',
-                       'total_amount', 'currency',
+                       'total_amount', 'currency', 'amount_rub', 'paid_at',
                        'created_at', 'updated_at')
     list_display = ('id', 'user', 'status', 'total_amount', 'currency',
                     'created_at')
@@ -195,6 +196,30 @@ class OrderItemAdmin(admin.ModelAdmin):
         return self.readonly_fields
 
 
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'type', 'object_id', 'status', 'attempts', 'received_at', 'processed_at')
+    readonly_fields = ('event_id', 'type', 'object_id', 'payload', 'attempts', 'last_error',
+                       'stripe_created', 'received_at', 'locked_at', 'processed_at')
+    list_filter = ('status', 'type')
+    search_fields = ('event_id', 'object_id')
+    actions = ['requeue']
+
+    @admin.action(description="Вернуть в очередь")
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status=StripeEvent.PROCESSING).update(
+            status=StripeEvent.PENDING, attempts=0, available_at=timezone.now())
+        self.message_user(request, f"Возвращено в очередь: {updated}", messages.SUCCESS)
+
+
+@admin.register(UserSpend)
+class UserSpendAdmin(admin.ModelAdmin):
+    list_display = ('user', 'total_rub', 'orders_count', 'updated_at')
+    readonly_fields = ('user', 'total_rub', 'orders_count', 'updated_at')
+    search_fields = ('user__username',)
+    ordering = ('-total_rub',)
+
+
 @admin.register(RankCategory)
 class RankCategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'min_total', 'discount')
@@ -0,0 +1,12 @@
+from rest_framework.authentication import SessionAuthentication
+
+
+class CsrfSessionAuthentication(SessionAuthentication):
+    """
+    Сессионная аутентификация, проверяющая CSRF и для анонимов:
+    гостевая корзина тоже изменяется по cookie.
+    """
+
+    def authenticate(self, request):
+        self.enforce_csrf(request)
+        return super().authenticate(request)
@@ -0,0 +1,131 @@
+import hashlib
+import re
+import time
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+# Версии наборов данных хранятся в БД (shop.models.DataVersion): их меняют и веб-сервер,
+# и команды manage.py. Процесс держит прочитанную версию CACHE_VERSION_LOCAL_TTL секунд.
+_local_versions = {}
+
+
+def _data_versions():
+    # models импортирует этот модуль, поэтому модель берётся при вызове
+    from .models import DataVersion
+    return DataVersion.objects
+
+
+def _remember(name, version, modified):
+    _local_versions[name] = (version, modified, time.monotonic() + settings.CACHE_VERSION_LOCAL_TTL)
+
+
+def _current(name):
+    local = _local_versions.get(name)
+    if local is None or local[2] <= time.monotonic():
+        _remember(name, *_data_versions().current(name))
+        local = _local_versions[name]
+    return local
+
+
+def get_version(name):
+    """Текущая версия именованного набора данных (для ключей кэша)"""
+    return _current(name)[0]
+
+
+def _bump(name):
+    _remember(name, *_data_versions().bump(name))
+
+
+def bump_version(name):
+    """
+    Увеличить версию после фиксации текущей транзакции: все ключи со старой версией
+    становятся неактуальными. До фиксации читатели не видят новых данных и не должны
+    кэшировать старые под новой версией. Вне транзакции версия меняется сразу.
+    """
+    transaction.on_commit(partial(_bump, name))
+
+
+def get_modified(name):
+    """Время последнего изменения набора данных name (хранится в процессе вместе с версией)"""
+    return _current(name)[1]
+
+
+def versioned_key(name, *parts):
+    return ":".join([name, str(get_version(name)), *map(str, parts)])
+
+
+def get_or_set(name, parts, default, timeout=None):
+    """Кэш с ключом, зависящим от версии набора данных name"""
+    if timeout is None:
+        timeout = settings.CATALOG_CACHE_TIMEOUT
+    return cache.get_or_set(versioned_key(name, *parts), default, timeout)
+
+
+def invalidate_cart_badge(user_id):
+    """
+    Сброс значка корзины (см. shop.cart.get_cart_badge); смену цен учитывает версия каталога.
+    Значок лежит в сессии и привязан к user.cart_version: корзину очищает и обработчик
+    событий Stripe в другом процессе, а пользователь и так загружается на каждой странице.
+    """
+    get_user_model().objects.filter(pk=user_id).update(cart_version=F("cart_version") + 1)
+
+
+PAGE_CACHE_PREFIX = "page"
+CSRF_INPUT_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+# Счётчики метрик лежат в кэше default (LocMemCache), то есть свои у каждого процесса:
+# /api/v1/metrics/ показывает только процесс, обслуживший запрос.
+def incr_counter(name, delta=1):
+    key = f"counter:{name}"
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, delta)
+
+
+def get_counters(*names):
+    values = cache.get_many([f"counter:{name}" for name in names])
+    return {name: values.get(f"counter:{name}", 0) for name in names}
+
+
+def is_page_cacheable(request):
+    """Кэшируются только GET-запросы анонимов без flash-сообщений и гостевой корзины"""
+    return (request.method in ("GET", "HEAD")
+            and not request.user.is_authenticated
+            and "messages" not in request.COOKIES
+            and settings.GUEST_CART_COOKIE_NAME not in request.COOKIES)
+
+
+def page_cache_key(request):
+    digest = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return versioned_key("catalog", PAGE_CACHE_PREFIX, digest)
+
+
+def get_cached_page(request):
+    cached = cache.get(page_cache_key(request))
+    if cached is None:
+        incr_counter("page_cache_misses")
+        return None
+
+    incr_counter("page_cache_hits")
+    content, content_type = cached
+    # В закэшированной странице токен CSRF первого посетителя, подставляем свой
+    token = get_token(request)
+    content = CSRF_INPUT_RE.sub(lambda m: m.group(1) + token + m.group(2), content)
+    return HttpResponse(content, content_type=content_type)
+
+
+def cache_page_response(request, response):
+    if response.status_code == 200 and not response.streaming and not response.cookies:
+        cache.set(page_cache_key(request),
+                  (response.content.decode(response.charset), response["Content-Type"]),
+                  settings.CATALOG_CACHE_TIMEOUT)
@@ -0,0 +1,183 @@
+import hashlib
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import signing
+from .cache import get_or_set, get_version, invalidate_cart_badge
+from .models import Cart, CartItem, Item
+from .pricing import CartSummary, with_item_pricing
+
+GUEST_CART_SALT = "shop.guest_cart"
+
+
+class GuestCartItem:
+    """Позиция гостевой корзины с тем же интерфейсом, что и CartItem"""
+
+    def __init__(self, item, quantity):
+        self.item = item
+        self.quantity = quantity
+
+    def calculate_total_price(self):
+        return self.item.price * self.quantity
+
+
+class GuestCart:
+    """
+    Корзина анонимного посетителя: {id товара: количество} в подписанной cookie.
+    Изменения не пишутся в БД, cookie обновляет GuestCartMiddleware.
+    """
+
+    def __init__(self, quantities=None):
+        self.quantities = dict(quantities or {})
+        self.modified = False
+
+    @classmethod
+    def from_request(cls, request):
+        try:
+            raw = request.get_signed_cookie(
+                settings.GUEST_CART_COOKIE_NAME, salt=GUEST_CART_SALT,
+                max_age=settings.GUEST_CART_COOKIE_AGE)
+            quantities = {int(pk): int(quantity) for pk, quantity in json.loads(raw).items()}
+        except (KeyError, signing.BadSignature, ValueError, TypeError, AttributeError):
+            return cls()
+        return cls({pk: quantity for pk, quantity in quantities.items() if quantity > 0})
+
+    def save(self, response):
+        if not self.quantities:
+            response.delete_cookie(settings.GUEST_CART_COOKIE_NAME)
+            return
+        response.set_signed_cookie(
+            settings.GUEST_CART_COOKIE_NAME,
+            json.dumps(self.quantities, separators=(",", ":")),
+            salt=GUEST_CART_SALT,
+            max_age=settings.GUEST_CART_COOKIE_AGE,
+            secure=settings.SESSION_COOKIE_SECURE,
+            httponly=True,
+            samesite="Lax",
+        )
+
+    def add(self, item, quantity):
+        """False, если корзина уже заполнена до GUEST_CART_MAX_LINES позиций"""
+        if item.pk not in self.quantities and len(self.quantities) >= settings.GUEST_CART_MAX_LINES:
+            return False
+        self.quantities[item.pk] = self.quantities.get(item.pk, 0) + quantity
+        self.modified = True
+        return True
+
+    def set_quantity(self, item, quantity):
+        if quantity <= 0:
+            self.remove(item)
+        elif item.pk in self.quantities:
+            self.quantities[item.pk] = quantity
+            self.modified = True
+
+    def set_quantities(self, quantities):
+        for pk, quantity in quantities.items():
+            if quantity <= 0:
+                self.quantities.pop(pk, None)
+            elif pk in self.quantities or len(self.quantities) < settings.GUEST_CART_MAX_LINES:
+                self.quantities[pk] = quantity
+        self.modified = True
+
+    def remove(self, item):
+        if self.quantities.pop(item.pk, None) is not None:
+            self.modified = True
+
+    def clear(self):
+        if self.quantities:
+            self.quantities = {}
+            self.modified = True
+
+    def get_quantity(self, item):
+        return self.quantities.get(item.pk, 0)
+
+    def is_empty(self):
+        return not self.quantities
+
+    def get_items(self):
+        """Все товары корзины одним IN-запросом (плюс запрос налогов)"""
+        items = with_item_pricing(Item.objects.filter(pk__in=self.quantities)).in_bulk()
+        return [GuestCartItem(items[pk], quantity)
+                for pk, quantity in self.quantities.items() if pk in items]
+
+    def get_summary(self):
+        return CartSummary(self.get_items())
+
+
+def get_cart(request):
+    """Корзина текущего посетителя: из БД для пользователя, из cookie для гостя"""
+    if request.user.is_authenticated:
+        # Строка корзины не создаётся при просмотре: Cart.add сохранит её сам
+        return Cart.objects.filter(user=request.user).first() or Cart(user=request.user)
+    return request.guest_cart
+
+
+def merge_guest_cart(request, user):
+    """Перенести гостевую корзину в корзину пользователя одним upsert"""
+    guest_cart = getattr(request, "guest_cart", None)
+    if guest_cart is None or guest_cart.is_empty():
+        return
+    cart = Cart.objects.for_user(user)
+    CartItem.objects.add_quantities(cart, guest_cart.quantities)
+    invalidate_cart_badge(user.pk)
+    guest_cart.clear()
+
+
+def summarize_badge(rows):
+    """(количество, цена, символ валюты) -> данные значка; сумма только для одной валюты"""
+    count, total, symbols = 0, 0, set()
+    for quantity, price, symbol in rows:
+        count += quantity
+        total += price * quantity
+        symbols.add(symbol)
+    single = len(symbols) == 1
+    return {"count": count,
+            "total": total if single else None,
+            "currency": symbols.pop() if single else ""}
+
+
+EMPTY_BADGE = {"count": 0, "total": None, "currency": ""}
+
+
+def get_user_badge(request):
+    """
+    Значок пользователя хранится в сессии с ключом (версия корзины, версия каталога):
+    при попадании запросов к БД нет, версию корзины меняет invalidate_cart_badge.
+    """
+    user = request.user
+    key = [user.cart_version, get_version("catalog")]
+    stored = request.session.get("cart_badge")
+    if stored is not None and stored["key"] == key:
+        total = stored["total"]
+        return {"count": stored["count"], "currency": stored["currency"],
+                "total": None if total is None else Decimal(total)}
+
+    badge = summarize_badge(CartItem.objects.filter(cart__user_id=user.pk).values_list(
+        "quantity", "item__price", "item__currency__symbol"))
+    # Сессия сериализуется в JSON, поэтому сумма хранится строкой
+    request.session["cart_badge"] = {
+        **badge, "key": key, "total": None if badge["total"] is None else str(badge["total"])}
+    return badge
+
+
+def get_cart_badge(request):
+    """
+    Количество и сумма для значка корзины в меню.
+    Берутся из сессии или кэша; при промахе - один запрос без создания корзины.
+    """
+    if request.user.is_authenticated:
+        return get_user_badge(request)
+
+    quantities = request.guest_cart.quantities
+    if not quantities:
+        return EMPTY_BADGE
+    # Для гостя кэшируется по содержимому cookie: одинаковые корзины делят запись
+    digest = hashlib.md5(json.dumps(sorted(quantities.items())).encode()).hexdigest()
+
+    def compute():
+        prices = {pk: (price, symbol) for pk, price, symbol in Item.objects.filter(
+            pk__in=quantities).values_list("pk", "price", "currency__symbol")}
+        return summarize_badge((quantity, *prices[pk])
+                               for pk, quantity in quantities.items() if pk in prices)
+    return get_or_set("catalog", ["cart_badge", "guest", digest], compute)
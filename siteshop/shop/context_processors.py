@@ -0,0 +1,7 @@
+from django.utils.functional import SimpleLazyObject
+from .cart import get_cart_badge
+
+
+def cart_badge(request):
+    """Значок корзины в меню; считается только если шаблон к нему обращается"""
+    return {"cart_badge": SimpleLazyObject(lambda: get_cart_badge(request))}
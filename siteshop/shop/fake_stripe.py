@@ -0,0 +1,442 @@
+"""
+Локальная заглушка Stripe API для офлайн-разработки и нагрузочных тестов.
+
+Реализует только то, что вызывает магазин (см. stripe_gateway.OPERATIONS),
+плюс страницу оплаты Checkout и подтверждение PaymentIntent, после которых
+отправляет подписанный вебхук. Запуск: manage.py fake_stripe.
+"""
+import hashlib
+import hmac
+import json
+import random
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from .money import Money, basis_points, div_round
+
+KEY_PART = re.compile(r"^([^\[]+)|\[([^\]]*)\]")
+
+
+def parse_form(body):
+    """Тело application/x-www-form-urlencoded в формате Stripe (a[0][b]=1) во вложенный dict"""
+    data = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        parts = [match.group(1) or match.group(2) for match in KEY_PART.finditer(key)]
+        node = data
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return _lists(data)
+
+
+def _lists(node):
+    """Словари с ключами 0, 1, 2... превращаются в списки"""
+    if not isinstance(node, dict):
+        return node
+    node = {key: _lists(value) for key, value in node.items()}
+    if node and all(key.isdigit() for key in node):
+        return [node[key] for key in sorted(node, key=int)]
+    return node
+
+
+def _int(value, default=None):
+    return int(value) if value not in (None, "") else default
+
+
+def _bool(value, default=False):
+    return value == "true" if value is not None else default
+
+
+def _float(value, default=None):
+    return float(value) if value not in (None, "") else default
+
+
+class StripeError(Exception):
+    def __init__(self, status, message, error_type="invalid_request_error", code=None):
+        super().__init__(message)
+        self.status = status
+        self.body = {"error": {"type": error_type, "message": message, "code": code}}
+
+
+def missing(kind, object_id):
+    return StripeError(404, f"No such {kind}: '{object_id}'", code="resource_missing")
+
+
+class FakeStripe:
+    """Состояние заглушки: объекты по типам, ответы по ключам идемпотентности"""
+
+    def __init__(self, webhook_url=None, webhook_secret=None, auto_pay=False):
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.auto_pay = auto_pay
+        self.objects = {"tax_rate": {}, "coupon": {}, "checkout.session": {}, "payment_intent": {}}
+        self.idempotent = {}
+        self._lock = threading.Lock()
+
+    def seed(self, taxes, discounts):
+        """Завести налоги и купоны магазина под их stripe id, чтобы ссылки на них работали"""
+        for tax in taxes:
+            if tax.stripe_tax_id:
+                self.create_tax_rate({
+                    "display_name": tax.display_name, "percentage": str(tax.percentage),
+                    "inclusive": str(tax.inclusive).lower(), "active": str(tax.active).lower(),
+                    "country": tax.country or None, "description": tax.description or None,
+                    "jurisdiction": tax.jurisdiction or None, "state": tax.state or None,
+                }, object_id=tax.stripe_tax_id)
+        for discount in discounts:
+            if discount.stripe_coupon_id:
+                params = {"id": discount.stripe_coupon_id, "name": discount.name,
+                          "duration": discount.duration,
+                          "duration_in_months": discount.duration_in_months}
+                if discount.amount_off:
+                    amount_off = Money.from_decimal(discount.amount_off, discount.currency.code)
+                    params.update(amount_off=amount_off.stripe_amount, currency=amount_off.currency)
+                else:
+                    params["percent_off"] = str(discount.percent_off)
+                self.create_coupon(params)
+
+    @staticmethod
+    def new_id(prefix):
+        return f"{prefix}_test_{secrets.token_hex(12)}"
+
+    def get(self, kind, object_id):
+        try:
+            return self.objects[kind][object_id]
+        except KeyError:
+            raise missing(kind, object_id) from None
+
+    def add(self, kind, obj):
+        obj.setdefault("created", int(time.time()))
+        obj.setdefault("livemode", False)
+        obj.setdefault("metadata", {})
+        self.objects[kind][obj["id"]] = obj
+        return obj
+
+    def list(self, kind, params, url):
+        """Список в порядке Stripe (новые первыми) с курсорами starting_after/ending_before"""
+        objects = list(reversed(self.objects[kind].values()))
+        limit = min(_int(params.get("limit"), 10), 100)
+        ids = [obj["id"] for obj in objects]
+        if params.get("starting_after"):
+            objects = objects[ids.index(params["starting_after"]) + 1:] \
+                if params["starting_after"] in ids else []
+            page = objects[:limit]
+        elif params.get("ending_before"):
+            objects = objects[:ids.index(params["ending_before"])] \
+                if params["ending_before"] in ids else []
+            page = objects[-limit:]
+        else:
+            page = objects[:limit]
+        return {"object": "list", "url": url, "has_more": len(objects) > len(page), "data": page}
+
+    # --- налоги и купоны ---
+
+    def create_tax_rate(self, params, object_id=None):
+        return self.add("tax_rate", {
+            "id": object_id or self.new_id("txr"),
+            "object": "tax_rate",
+            "active": _bool(params.get("active"), True),
+            "country": params.get("country"),
+            "description": params.get("description"),
+            "display_name": params["display_name"],
+            "inclusive": _bool(params.get("inclusive")),
+            "jurisdiction": params.get("jurisdiction"),
+            "percentage": _float(params["percentage"]),
+            "effective_percentage": _float(params["percentage"]),
+            "state": params.get("state"),
+            "tax_type": params.get("tax_type"),
+        })
+
+    def update_tax_rate(self, object_id, params):
+        tax_rate = self.get("tax_rate", object_id)
+        for field in ("display_name", "description", "country", "jurisdiction", "state"):
+            if field in params:
+                tax_rate[field] = params[field] or None
+        if "active" in params:
+            tax_rate["active"] = _bool(params["active"])
+        return tax_rate
+
+    def create_coupon(self, params):
+        object_id = params.get("id") or secrets.token_hex(4)
+        if object_id in self.objects["coupon"]:
+            raise StripeError(400, "Coupon already exists.", code="resource_already_exists")
+        return self.add("coupon", {
+            "id": object_id,
+            "object": "coupon",
+            "name": params.get("name"),
+            "amount_off": _int(params.get("amount_off")),
+            "currency": params.get("currency"),
+            "percent_off": _float(params.get("percent_off")),
+            "duration": params.get("duration", "once"),
+            "duration_in_months": _int(params.get("duration_in_months")),
+            "max_redemptions": _int(params.get("max_redemptions")),
+            "redeem_by": _int(params.get("redeem_by")),
+            "times_redeemed": 0,
+            "valid": True,
+        })
+
+    def update_coupon(self, object_id, params):
+        coupon = self.get("coupon", object_id)
+        if "name" in params:
+            coupon["name"] = params["name"] or None
+        return coupon
+
+    def delete_coupon(self, object_id):
+        self.get("coupon", object_id)
+        del self.objects["coupon"][object_id]
+        return {"id": object_id, "object": "coupon", "deleted": True}
+
+    # --- оплата ---
+
+    def session_amounts(self, params):
+        """Суммы сессии как у Stripe: купон от подытога, налоги tax_rates сверху - от суммы после скидки"""
+        lines = []
+        currency = None
+        for line in params.get("line_items", []):
+            price = line.get("price_data", {})
+            currency = currency or price.get("currency")
+            amount = _int(price.get("unit_amount"), 0) * _int(line.get("quantity"), 1)
+            lines.append((amount, [self.get("tax_rate", tax_id) for tax_id in line.get("tax_rates", [])]))
+        subtotal = sum(amount for amount, _ in lines)
+        discount = 0
+        for item in params.get("discounts", []):
+            coupon = self.get("coupon", item["coupon"])
+            if coupon["amount_off"]:
+                discount += coupon["amount_off"]
+            else:
+                discount += div_round(subtotal * basis_points(coupon["percent_off"]), 10000)
+        discounted = max(subtotal - discount, 0)
+        tax = 0
+        for amount, tax_rates in lines:
+            share = div_round(amount * discounted, subtotal) if subtotal else 0
+            tax += sum(div_round(share * basis_points(tax_rate["percentage"]), 10000)
+                       for tax_rate in tax_rates if not tax_rate["inclusive"])
+        return subtotal, discounted + tax, currency
+
+    def create_session(self, params, base_url):
+        subtotal, total, currency = self.session_amounts(params)
+        object_id = self.new_id("cs")
+        session = self.add("checkout.session", {
+            "id": object_id,
+            "object": "checkout.session",
+            "mode": params.get("mode", "payment"),
+            "status": "open",
+            "payment_status": "unpaid",
+            "amount_subtotal": subtotal,
+            "amount_total": total,
+            "currency": currency,
+            "payment_intent": None,
+            "success_url": params.get("success_url"),
+            "cancel_url": params.get("cancel_url"),
+            "url": f"{base_url}/checkout/{object_id}",
+            "metadata": params.get("metadata", {}),
+        })
+        if self.auto_pay:
+            self.pay_session(object_id)
+        return session
+
+    def pay_session(self, object_id):
+        """Оплата на странице Checkout: сессия завершена, создан оплаченный PaymentIntent"""
+        session = self.get("checkout.session", object_id)
+        if session["payment_status"] != "paid":
+            payment_intent = self.add("payment_intent", {
+                "id": self.new_id("pi"),
+                "object": "payment_intent",
+                "amount": session["amount_total"],
+                "amount_received": session["amount_total"],
+                "currency": session["currency"],
+                "status": "succeeded",
+            })
+            session.update(status="complete", payment_status="paid",
+                           payment_intent=payment_intent["id"])
+            self.send_event("checkout.session.completed", session)
+        return session
+
+    def create_payment_intent(self, params):
+        object_id = self.new_id("pi")
+        payment_intent = self.add("payment_intent", {
+            "id": object_id,
+            "object": "payment_intent",
+            "amount": _int(params["amount"]),
+            "amount_received": 0,
+            "currency": params["currency"],
+            "status": "requires_payment_method",
+            "client_secret": f"{object_id}_secret_{secrets.token_hex(12)}",
+            "automatic_payment_methods": {
+                "enabled": _bool(params.get("automatic_payment_methods", {}).get("enabled"))},
+            "metadata": params.get("metadata", {}),
+        })
+        if self.auto_pay:
+            self.confirm_payment_intent(object_id)
+        return payment_intent
+
+    def confirm_payment_intent(self, object_id):
+        payment_intent = self.get("payment_intent", object_id)
+        if payment_intent["status"] != "succeeded":
+            payment_intent.update(status="succeeded", amount_received=payment_intent["amount"])
+            self.send_event("payment_intent.succeeded", payment_intent)
+        return payment_intent
+
+    # --- вебхуки ---
+
+    def sign(self, payload, timestamp):
+        signed = f"{timestamp}.{payload}".encode()
+        digest = hmac.new(self.webhook_secret.encode(), signed, hashlib.sha256).hexdigest()
+        return f"t={timestamp},v1={digest}"
+
+    def send_event(self, event_type, obj):
+        """Подписанный вебхук отправляется в фоне, чтобы не задерживать ответ API"""
+        if not self.webhook_url:
+            return
+        created = int(time.time())
+        payload = json.dumps({
+            "id": self.new_id("evt"),
+            "object": "event",
+            "type": event_type,
+            "created": created,
+            "livemode": False,
+            "data": {"object": dict(obj)},
+        })
+        threading.Thread(target=self.post_event, args=(payload, created), daemon=True).start()
+
+    def post_event(self, payload, timestamp):
+        request = urllib.request.Request(self.webhook_url, data=payload.encode(), method="POST", headers={
+            "Content-Type": "application/json",
+            "Stripe-Signature": self.sign(payload, timestamp),
+        })
+        try:
+            urllib.request.urlopen(request, timeout=10).close()
+        except OSError:
+            pass
+
+    # --- маршрутизация ---
+
+    def dispatch(self, method, path, params, base_url):
+        """Ответ на запрос к /v1/...: (статус, объект)"""
+        parts = path.strip("/").split("/")[1:]
+        with self._lock:
+            match method, parts:
+                case "POST", ["tax_rates"]:
+                    return self.create_tax_rate(params)
+                case "POST", ["tax_rates", object_id]:
+                    return self.update_tax_rate(object_id, params)
+                case "GET", ["tax_rates"]:
+                    return self.list("tax_rate", params, "/v1/tax_rates")
+                case "GET", ["tax_rates", object_id]:
+                    return self.get("tax_rate", object_id)
+                case "POST", ["coupons"]:
+                    return self.create_coupon(params)
+                case "POST", ["coupons", object_id]:
+                    return self.update_coupon(object_id, params)
+                case "DELETE", ["coupons", object_id]:
+                    return self.delete_coupon(object_id)
+                case "GET", ["coupons"]:
+                    return self.list("coupon", params, "/v1/coupons")
+                case "GET", ["coupons", object_id]:
+                    return self.get("coupon", object_id)
+                case "POST", ["checkout", "sessions"]:
+                    return self.create_session(params, base_url)
+                case "GET", ["checkout", "sessions", object_id]:
+                    return self.get("checkout.session", object_id)
+                case "POST", ["payment_intents"]:
+                    return self.create_payment_intent(params)
+                case "GET", ["payment_intents", object_id]:
+                    return self.get("payment_intent", object_id)
+                case "POST", ["payment_intents", object_id, "confirm"]:
+                    return self.confirm_payment_intent(object_id)
+        raise StripeError(404, f"Unrecognized request URL ({method}: {path})")
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeStripe"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_api(self, method):
+        server = self.server
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode() if length else url.query
+        params = parse_form(body)
+
+        if server.latency or server.jitter:
+            time.sleep((server.latency + random.uniform(0, server.jitter)) / 1000)
+        if server.error_rate and random.random() < server.error_rate:
+            self.send_json(server.error_status, {"error": {
+                "type": "api_error", "message": "Injected error (fake_stripe --error-rate)"}})
+            return
+
+        key = self.headers.get("Idempotency-Key") if method == "POST" else None
+        if key and key in server.stripe.idempotent:
+            status, data = server.stripe.idempotent[key]
+            self.send_json(status, data, {"Idempotent-Replayed": "true"})
+            return
+        try:
+            status, data = 200, server.stripe.dispatch(
+                method, url.path, params, f"http://{self.headers.get('Host')}")
+        except StripeError as e:
+            status, data = e.status, e.body
+        except (KeyError, ValueError) as e:
+            status, data = 400, {"error": {"type": "invalid_request_error",
+                                           "message": f"Invalid request: {e}"}}
+        if key:
+            server.stripe.idempotent[key] = (status, data)
+        self.send_json(status, data)
+
+    def checkout_page(self):
+        """Страница оплаты Checkout: сразу оплачивает сессию и уводит на success_url"""
+        object_id = urlsplit(self.path).path.rstrip("/").rsplit("/", 1)[-1]
+        try:
+            with self.server.stripe._lock:
+                session = self.server.stripe.pay_session(object_id)
+        except StripeError as e:
+            self.send_json(e.status, e.body)
+            return
+        self.send_response(303)
+        self.send_header("Location", session["success_url"].replace("{CHECKOUT_SESSION_ID}", object_id))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path.startswith("/checkout/"):
+            self.checkout_page()
+        else:
+            self.handle_api("GET")
+
+    def do_POST(self):
+        self.handle_api("POST")
+
+    def do_DELETE(self):
+        self.handle_api("DELETE")
+
+
+class FakeStripeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, stripe, latency=0, jitter=0, error_rate=0, error_status=500,
+                 verbose=False):
+        super().__init__(address, FakeStripeHandler)
+        self.stripe = stripe
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.verbose = verbose
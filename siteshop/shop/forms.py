@@ -1,7 +1,11 @@
 from decimal import Decimal
 from django import forms
-from .models import Item
-from .utils import MIN_AMOUNTS
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from .models import Currency, Item
+from .money import Money
+from .utils import MIN_AMOUNTS, currency_table
 
 
 class ItemForm(forms.ModelForm):
@@ -16,13 +20,14 @@ class ItemForm(forms.ModelForm):
     def clean(self):
         price = self.cleaned_data.get('price')
         currency = self.cleaned_data.get('currency')
-        currency_code = currency.code
         if price is None or currency is None:
             return self.cleaned_data
 
-        if price * 100 < MIN_AMOUNTS[currency_code]:
+        currency_code = currency.code.lower()
+        min_amount = Money(MIN_AMOUNTS[currency_code], currency_code)
+        if Money.from_decimal(price, currency_code) < min_amount:
             raise forms.ValidationError({
-                'price': f'Минимальная стоимость для данной валюты: {MIN_AMOUNTS[currency_code] / 100}'
+                'price': f'Минимальная стоимость для данной валюты: {min_amount}'
             })
         return self.cleaned_data
 
@@ -39,3 +44,71 @@ class AddToCartForm(forms.Form):
             'max': '99'
         })
     )
+
+
+def price_bucket_q(low, high):
+    """Диапазон фасета цены: полуинтервал [low, high), чтобы соседние диапазоны не пересекались"""
+    condition = Q(price__gte=low)
+    if high is not None:
+        condition &= Q(price__lt=high)
+    return condition
+
+
+class CatalogFilterForm(forms.Form):
+    """Фильтры каталога (GET-параметры)"""
+    price_min = forms.DecimalField(min_value=0, required=False, label='Цена от')
+    price_max = forms.DecimalField(min_value=0, required=False, label='Цена до')
+    # Номер диапазона из CATALOG_PRICE_BUCKETS (ссылки фасета цены)
+    price_range = forms.IntegerField(min_value=0, required=False, widget=forms.HiddenInput)
+    currency = forms.ModelChoiceField(
+        queryset=Currency.objects.filter(is_active=True), to_field_name='code',
+        required=False, label='Валюта')
+    seller = forms.ModelChoiceField(
+        queryset=get_user_model().objects.all(), required=False, label='Продавец')
+    tax_inclusive = forms.BooleanField(required=False, label='Налог включён в цену')
+
+    def get_valid_data(self):
+        """Корректно заполненные поля; ошибочные параметры просто игнорируются"""
+        if not self.is_bound:
+            return {}
+        self.is_valid()
+        return self.cleaned_data
+
+    def clean_price_range(self):
+        index = self.cleaned_data.get('price_range')
+        if index is not None and index >= len(settings.CATALOG_PRICE_BUCKETS):
+            raise forms.ValidationError('Неизвестный диапазон цен')
+        return index
+
+    def get_price_currency(self):
+        """Валюта, в которой сравниваются цены: выбранная или CATALOG_PRICE_CURRENCY"""
+        return self.get_valid_data().get('currency') or currency_table.get(
+            settings.CATALOG_PRICE_CURRENCY)
+
+    def price_currency_q(self):
+        currency = self.get_price_currency()
+        return Q(currency_id=currency.pk) if currency is not None else Q()
+
+    def get_filters(self):
+        """Условия фильтрации по группам: каждая группа - отдельный фасет"""
+        data = self.get_valid_data()
+        filters = {}
+
+        # Введённые границы включаются в диапазон, полуинтервалы - только у фасетов
+        price = Q()
+        if data.get('price_range') is not None:
+            price &= price_bucket_q(*settings.CATALOG_PRICE_BUCKETS[data['price_range']])
+        if data.get('price_min') is not None:
+            price &= Q(price__gte=data['price_min'])
+        if data.get('price_max') is not None:
+            price &= Q(price__lte=data['price_max'])
+        if price:
+            filters['price'] = price & self.price_currency_q()
+
+        if data.get('currency'):
+            filters['currency'] = Q(currency=data['currency'])
+        if data.get('seller'):
+            filters['seller'] = Q(owner=data['seller'])
+        if data.get('tax_inclusive'):
+            filters['tax_inclusive'] = Q(tax_profile__inclusive=True)
+        return filters
@@ -0,0 +1,118 @@
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+from PIL import Image, ImageOps
+
+
+def variant_path(name, width, ext):
+    """items/2025/01/01/photo.jpg -> items/2025/01/01/variants/photo_300.webp"""
+    head, tail = posixpath.split(name)
+    base = posixpath.splitext(tail)[0]
+    return posixpath.join(head, "variants", f"{base}_{width}.{ext}")
+
+
+def _encode(image, fmt, quality):
+    buffer = BytesIO()
+    if fmt == "JPEG":
+        image = image.convert("RGB")
+    image.save(buffer, fmt, quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def _store(storage, name, content):
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(content))
+
+
+def render_variants(name, widths=None, quality=None, storage=None):
+    """
+    Миниатюры изображения для каждой ширины: WebP и запасной вариант
+    (JPEG, для изображений с прозрачностью - PNG).
+    Зависит только от имени файла, поэтому подходит для пула процессов.
+    """
+    storage = storage or default_storage
+    widths = sorted(widths or settings.IMAGE_VARIANT_WIDTHS)
+    quality = quality or settings.IMAGE_VARIANT_QUALITY
+
+    with storage.open(name) as source:
+        original = Image.open(source)
+        original.load()
+    original = ImageOps.exif_transpose(original)
+
+    has_alpha = original.mode in ("RGBA", "LA", "PA") or "transparency" in original.info
+    fallback_format, fallback_ext = ("PNG", "png") if has_alpha else ("JPEG", "jpg")
+    original = original.convert("RGBA" if has_alpha else "RGB")
+
+    sizes = []
+    for width in widths:
+        thumb = original.copy()
+        thumb.thumbnail((width, width), Image.Resampling.LANCZOS)
+        # Исходник меньше запрошенной ширины: увеличивать не будем
+        if sizes and thumb.width == sizes[-1]["width"]:
+            continue
+        sizes.append({
+            "width": thumb.width,
+            "height": thumb.height,
+            "webp": _store(storage, variant_path(name, width, "webp"),
+                           _encode(thumb, "WEBP", quality)),
+            "fallback": _store(storage, variant_path(name, width, fallback_ext),
+                               _encode(thumb, fallback_format, quality)),
+        })
+    return {"source": name, "sizes": sizes}
+
+
+def delete_variants(variants, storage=None):
+    storage = storage or default_storage
+    for size in (variants or {}).get("sizes", []):
+        storage.delete(size["webp"])
+        storage.delete(size["fallback"])
+
+
+def sync_variants(instance, field, variants_field):
+    """
+    Пересобрать варианты, если изображение в поле field сменилось.
+    Результат сохраняется через update(), чтобы не вызывать сигналы повторно.
+    """
+    image = getattr(instance, field)
+    name = image.name if image else ""
+    variants = getattr(instance, variants_field) or {}
+    if variants.get("source", "") == name:
+        return False
+
+    delete_variants(variants)
+    new_variants = {}
+    if name:
+        try:
+            new_variants = render_variants(name)
+        except OSError:
+            # Битый или недоступный файл: шаблоны покажут исходное изображение
+            new_variants = {"source": name, "sizes": []}
+
+    setattr(instance, variants_field, new_variants)
+    type(instance)._default_manager.filter(pk=instance.pk).update(
+        **{variants_field: new_variants})
+    return True
+
+
+def srcset(variants, key, storage=None):
+    storage = storage or default_storage
+    return ", ".join(f"{storage.url(size[key])} {size['width']}w"
+                     for size in (variants or {}).get("sizes", []))
+
+
+def picture_html(url, variants=None, sizes="100vw", **attrs):
+    """<picture> с WebP-вариантами; браузер сам выбирает ширину по sizes"""
+    attrs = flatatt(attrs)
+    if not variants or not variants.get("sizes"):
+        return format_html('<img src="{}"{}>', url, attrs)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        srcset(variants, "webp"), sizes,
+        url, srcset(variants, "fallback"), sizes, attrs)
@@ -0,0 +1,63 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = "Замер пропускной способности (запросов/с) списка товаров API"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500,
+                            help="Количество запросов в каждом прогоне")
+        parser.add_argument("--pages", type=int, default=5,
+                            help="Глубина прохода по курсорам")
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--fields", default="",
+                            help="Параметр ?fields= для запросов")
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST="localhost")
+        urls = self.collect_urls(client, options)
+        self.stdout.write(f"Страниц в обходе: {len(urls)}")
+
+        cache.clear()
+        self.run("Без кэша", client, urls, options["requests"], clear_cache=True)
+        self.run("С кэшем", client, urls, options["requests"])
+
+    def collect_urls(self, client, options):
+        params = {"page_size": options["page_size"]}
+        if options["fields"]:
+            params["fields"] = options["fields"]
+        response = client.get(reverse("api-items"), params)
+        urls = [response.request["PATH_INFO"] + "?" + response.request["QUERY_STRING"]]
+        data = response.json()
+        while data["next"] and len(urls) < options["pages"]:
+            urls.append(data["next"])
+            data = client.get(data["next"]).json()
+        return urls
+
+    def run(self, label, client, urls, total, clear_cache=False):
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            for index in range(total):
+                if clear_cache:
+                    cache.clear()
+                response = client.get(urls[index % len(urls)])
+                if response.status_code != 200:
+                    self.stderr.write(f"{response.status_code}: {urls[index % len(urls)]}")
+                    return
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{label}: {total / elapsed:.0f} запросов/с, "
+            f"{queries / total:.1f} SQL-запросов на запрос")
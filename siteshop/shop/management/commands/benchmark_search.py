@@ -0,0 +1,83 @@
+import random
+import statistics
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from shop.cache import bump_version
+from shop.models import Category, Currency, Item
+from shop.pagination import KeysetPaginator
+
+WORDS = ("ёлка", "игрушка", "шар", "гирлянда", "подарок", "конфета", "свеча",
+         "мандарин", "шапка", "варежки", "снеговик", "фонарик", "звезда",
+         "плед", "кружка", "носки", "печенье", "открытка", "колокольчик", "санки")
+
+QUERIES = ("ёлка", "новогодний подарок", "шоколадные конфеты", "гирлянда",
+           "тёплые варежки", "гирлянды", "подорок", "снеговик звезда")
+
+
+class Command(BaseCommand):
+    help = "Замер задержки поиска товаров (p50/p95) с генерацией тестового каталога"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--generate", type=int, default=0,
+                            help="Сгенерировать указанное количество товаров перед замером")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--runs", type=int, default=200,
+                            help="Количество поисковых запросов")
+        parser.add_argument("--per-page", type=int, default=12)
+
+    def handle(self, *args, **options):
+        if options["generate"]:
+            self.generate(options["generate"], options["batch_size"])
+
+        paginator = KeysetPaginator(("-rank", "id"), per_page=options["per_page"])
+        timings = []
+        for _ in range(options["runs"]):
+            query = random.choice(QUERIES)
+            started = time.perf_counter()
+            paginator.paginate(Item.published.search(query).cards())
+            timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+        self.stdout.write(self.style.SUCCESS(
+            f"Товаров: {Item.published.count()}, запросов: {len(timings)}\n"
+            f"p50: {statistics.median(timings):.1f} мс, p95: {p95:.1f} мс, "
+            f"max: {timings[-1]:.1f} мс"
+        ))
+
+    def generate(self, total, batch_size):
+        owner = get_user_model().objects.filter(is_superuser=True).first()
+        currency = Currency.objects.filter(is_active=True).first()
+        categories = list(Category.objects.all())
+        if owner is None or currency is None or not categories:
+            raise CommandError("Нужны суперпользователь, активная валюта и хотя бы одна категория")
+
+        created = 0
+        while created < total:
+            size = min(batch_size, total - created)
+            batch = [
+                Item(
+                    name=" ".join(random.sample(WORDS, 2)).capitalize()[:25],
+                    description=" ".join(random.choices(WORDS, k=20)),
+                    price=random.randint(100, 100000),
+                    owner=owner,
+                    currency=currency,
+                    category=random.choice(categories),
+                    slug=f"bench-{uuid.uuid4().hex}",
+                )
+                for _ in range(size)
+            ]
+            with transaction.atomic():
+                items = Item.objects.bulk_create(batch)
+                Item.objects.filter(pk__in=[item.pk for item in items]).update_search_vector()
+            created += size
+            self.stdout.write(f"Сгенерировано {created}/{total}")
+
+        Category.objects.refresh_items_count()
+        bump_version("categories")
+        bump_version("catalog")
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shop.fake_stripe import FakeStripe, FakeStripeServer
+from shop.models import Discount, Tax
+
+
+class Command(BaseCommand):
+    help = """
+    Локальная заглушка Stripe API: налоги, купоны, Checkout Session и PaymentIntent
+    без сети. Укажите в настройках STRIPE_API_BASE = "http://127.0.0.1:12111".
+    Налоги и купоны магазина заводятся при запуске под своими stripe id;
+    остальное состояние хранится в памяти и теряется при остановке.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=12111)
+        parser.add_argument("--latency", type=float, default=0,
+                            help="Задержка каждого ответа API (мс)")
+        parser.add_argument("--jitter", type=float, default=0,
+                            help="Случайная добавка к задержке, от 0 до указанной (мс)")
+        parser.add_argument("--error-rate", type=float, default=0,
+                            help="Доля запросов API, на которые отвечать ошибкой (0..1)")
+        parser.add_argument("--error-status", type=int, default=500,
+                            help="HTTP-статус внедрённых ошибок (например, 500 или 429)")
+        parser.add_argument("--webhook-url", default=None,
+                            help="Куда слать подписанные события, например "
+                                 "http://127.0.0.1:8000/stripe/webhook/")
+        parser.add_argument("--webhook-secret", default=settings.STRIPE_WEBHOOK_SECRET,
+                            help="Секрет подписи (по умолчанию STRIPE_WEBHOOK_SECRET)")
+        parser.add_argument("--auto-pay", action="store_true",
+                            help="Сразу оплачивать созданные сессии и PaymentIntent")
+        parser.add_argument("--no-seed", action="store_true",
+                            help="Не заводить налоги и купоны из базы магазина")
+
+    def handle(self, *args, **options):
+        stripe = FakeStripe(webhook_url=options["webhook_url"],
+                            webhook_secret=options["webhook_secret"],
+                            auto_pay=options["auto_pay"])
+        if not options["no_seed"]:
+            stripe.seed(Tax.objects.all(), Discount.objects.select_related("currency"))
+        server = FakeStripeServer(
+            (options["host"], options["port"]), stripe,
+            latency=options["latency"], jitter=options["jitter"],
+            error_rate=options["error_rate"], error_status=options["error_status"],
+            verbose=options["verbosity"] > 1)
+        self.stdout.write(self.style.SUCCESS(
+            f"Заглушка Stripe: http://{options['host']}:{options['port']} (Ctrl+C для остановки)"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,80 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from shop.cache import bump_version
+from shop.images import delete_variants, render_variants
+from shop.models import Item
+
+
+def _render(name):
+    """Выполняется в дочернем процессе: без обращений к БД"""
+    try:
+        return render_variants(name), None
+    except OSError as e:
+        return {"source": name, "sizes": []}, str(e)
+
+
+class Command(BaseCommand):
+    help = "Создать миниатюры и WebP-варианты для уже загруженных изображений"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                            help="Количество процессов")
+        parser.add_argument("--batch-size", type=int, default=200,
+                            help="Размер пачки для bulk_update")
+        parser.add_argument("--force", action="store_true",
+                            help="Пересоздать варианты, даже если они актуальны")
+
+    def handle(self, *args, **options):
+        targets = (
+            (Item, "image", "image_variants"),
+            (get_user_model(), "photo", "photo_variants"),
+        )
+        started = time.perf_counter()
+        total = 0
+        for model, field, variants_field in targets:
+            total += self.backfill(model, field, variants_field, options)
+
+        bump_version("catalog")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Обработано изображений: {total} за {elapsed:.1f} с"))
+
+    def backfill(self, model, field, variants_field, options):
+        queryset = (model._default_manager.exclude(**{f"{field}__isnull": True})
+                    .exclude(**{field: ""}).only("pk", field, variants_field).order_by("pk"))
+        pending = []
+        for obj in queryset.iterator():
+            variants = getattr(obj, variants_field) or {}
+            name = getattr(obj, field).name
+            if options["force"] or variants.get("source") != name:
+                if variants.get("source") != name:
+                    delete_variants(variants)
+                pending.append(obj)
+        if not pending:
+            return 0
+
+        # Дочерние процессы не должны наследовать открытые соединения с БД
+        connections.close_all()
+        names = [getattr(obj, field).name for obj in pending]
+        chunksize = max(1, len(names) // (options["workers"] * 4))
+        batch = []
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            for obj, (variants, error) in zip(pending, pool.map(_render, names, chunksize=chunksize)):
+                if error:
+                    self.stderr.write(f"{model._meta.verbose_name} {obj.pk}: {error}")
+                setattr(obj, variants_field, variants)
+                batch.append(obj)
+                if len(batch) >= options["batch_size"]:
+                    model._default_manager.bulk_update(batch, [variants_field])
+                    batch = []
+        if batch:
+            model._default_manager.bulk_update(batch, [variants_field])
+
+        self.stdout.write(f"{model._meta.verbose_name_plural}: {len(pending)}")
+        return len(pending)
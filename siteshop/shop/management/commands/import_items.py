@@ -0,0 +1,247 @@
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.text import slugify
+
+from shop.cache import bump_version
+from shop.models import Category, Currency, Item, Tax, build_tax_profile
+
+TRANSLIT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh",
+    "з": "z", "и": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o",
+    "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "ts",
+    "ч": "ch", "ш": "sh", "щ": "sch", "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu",
+    "я": "ya",
+})
+
+TRUE_VALUES = {"1", "true", "yes", "да"}
+
+
+class Command(BaseCommand):
+    help = """
+    Потоковый импорт товаров из CSV или JSONL (по одной записи на строку).
+    Поля: name, price, currency (код), category (slug), owner (username),
+    description, slug, is_available, image (путь в MEDIA_ROOT),
+    taxes (stripe_tax_id через "|" в CSV или список в JSONL).
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help='Путь к файлу, "-" - стандартный ввод')
+        parser.add_argument("--format", choices=("csv", "jsonl"),
+                            help="Формат файла (по умолчанию - по расширению)")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--owner", help="username владельца для строк без owner")
+        parser.add_argument("--delimiter", default=",", help="Разделитель CSV")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or ("jsonl" if options["path"].endswith((".jsonl", ".ndjson")) else "csv")
+        self.currencies = {c.code.lower(): c for c in Currency.objects.filter(is_active=True)}
+        self.categories = dict(Category.objects.values_list("slug", "pk"))
+        self.taxes = {tax.stripe_tax_id: tax for tax in Tax.objects.filter(active=True)}
+        self.owners = {}
+        self.default_owner = self.resolve_owner(options["owner"]) if options["owner"] else None
+        if options["owner"] and self.default_owner is None:
+            raise CommandError(f'Пользователь "{options["owner"]}" не найден')
+
+        self.touched_categories = set()
+        stats = {"created": 0, "skipped": 0, "errors": 0}
+        started = time.perf_counter()
+
+        source = sys.stdin if options["path"] == "-" else open(options["path"], encoding="utf-8", newline="")
+        try:
+            rows = self.read_rows(source, fmt, options["delimiter"])
+            while True:
+                batch = list(islice(rows, options["batch_size"]))
+                if not batch:
+                    break
+                self.import_batch(batch, stats)
+                elapsed = time.perf_counter() - started
+                total = stats["created"] + stats["skipped"] + stats["errors"]
+                self.stdout.write(f"Обработано {total} строк, {total / elapsed:.0f} строк/с")
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        if self.touched_categories:
+            Category.objects.filter(pk__in=self.touched_categories).refresh_items_count()
+        bump_version("categories")
+        bump_version("catalog")
+
+        elapsed = time.perf_counter() - started
+        total = stats["created"] + stats["skipped"] + stats["errors"]
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано: {stats['created']}, пропущено: {stats['skipped']}, "
+            f"ошибок: {stats['errors']} за {elapsed:.1f} с ({total / elapsed:.0f} строк/с)"))
+        if stats["created"]:
+            self.stdout.write("Миниатюры изображений: manage.py generate_image_variants")
+
+    def read_rows(self, source, fmt, delimiter):
+        """Генератор (номер строки, запись): файл не читается в память целиком"""
+        if fmt == "csv":
+            reader = csv.DictReader(source, delimiter=delimiter)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_num, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_num, json.loads(line)
+            except ValueError as e:
+                yield line_num, e
+
+    def resolve_owner(self, username):
+        if username not in self.owners:
+            self.owners[username] = get_user_model().objects.filter(
+                username=username).values_list("pk", flat=True).first()
+        return self.owners[username]
+
+    def build_item(self, row):
+        """Проверка строки без обращений к БД (кроме первого появления владельца)"""
+        if isinstance(row, Exception):
+            raise ValidationError(f"неверный JSON: {row}")
+        if not isinstance(row, dict):
+            raise ValidationError(f"строка должна быть объектом JSON, получено: {type(row).__name__}")
+
+        def field(name, value):
+            return Item._meta.get_field(name).clean(value, None)
+
+        currency_code = (row.get("currency") or "").lower()
+        if currency_code not in self.currencies:
+            raise ValidationError(f'неизвестная валюта "{row.get("currency")}"')
+        category = row.get("category") or None
+        if category is not None and category not in self.categories:
+            raise ValidationError(f'неизвестная категория "{category}"')
+        owner_id = self.resolve_owner(row["owner"]) if row.get("owner") else self.default_owner
+        if owner_id is None:
+            raise ValidationError(f'не найден владелец "{row.get("owner", "")}"')
+
+        taxes = row.get("taxes") or []
+        if isinstance(taxes, str):
+            taxes = [tax for tax in taxes.split("|") if tax]
+        unknown = [tax for tax in taxes if tax not in self.taxes]
+        if unknown:
+            raise ValidationError(f"неизвестные налоги: {', '.join(unknown)}")
+
+        is_available = row.get("is_available", True)
+        if isinstance(is_available, str):
+            is_available = is_available.strip().lower() in TRUE_VALUES
+
+        price = field("price", row.get("price"))
+        currency = self.currencies[currency_code]
+        if price < currency.min_amount:
+            raise ValidationError(
+                f"минимальная стоимость для {currency.code}: {currency.min_amount}")
+
+        item = Item(
+            name=field("name", row.get("name") or ""),
+            description=field("description", row.get("description") or ""),
+            price=price,
+            currency_id=currency.pk,
+            category_id=self.categories.get(category),
+            owner_id=owner_id,
+            is_available=bool(is_available),
+            image=row.get("image") or "",
+            slug=row.get("slug") or "",
+            # Профиль налогов сразу: m2m_changed при bulk_create не отправляется
+            tax_profile=build_tax_profile([self.taxes[tax] for tax in taxes]),
+        )
+        if item.slug:
+            field("slug", item.slug)
+        return item, [self.taxes[tax].pk for tax in taxes]
+
+    def assign_slugs(self, items, reserved):
+        """
+        Уникальные slug для пачки: занятость проверяется одним IN-запросом,
+        для занятых основ следующий суффикс берётся по уже существующим -N.
+        """
+        remaining = []
+        counters = {}
+        for item in items:
+            base = slugify(item.name.lower().translate(TRANSLIT))[:90] or "item"
+            counters.setdefault(base, 1)
+            remaining.append((base, item))
+
+        # Занятые slug: явно указанные в пачке и уже выданные в этом вызове.
+        # Два товара могут предложить один slug в одном раунде - второй ждёт следующего.
+        claimed = set(reserved)
+        while remaining:
+            proposals = []
+            retry = []
+            for base, item in remaining:
+                slug = base if counters[base] == 1 else f"{base}-{counters[base]}"
+                counters[base] += 1
+                if slug in claimed:
+                    retry.append((base, item))
+                else:
+                    claimed.add(slug)
+                    proposals.append((slug, base, item))
+            taken = set(Item.objects.filter(
+                slug__in=[slug for slug, _, _ in proposals]).values_list("slug", flat=True))
+
+            conflicted = set()
+            for slug, base, item in proposals:
+                if slug in taken:
+                    retry.append((base, item))
+                    conflicted.add(base)
+                else:
+                    item.slug = slug
+            for base in conflicted:
+                counters[base] = max(counters[base], self.next_suffix(base))
+            remaining = retry
+
+    @staticmethod
+    def next_suffix(base):
+        suffixes = Item.objects.filter(slug__startswith=f"{base}-").values_list("slug", flat=True)
+        numbers = [int(tail) for tail in (slug[len(base) + 1:] for slug in suffixes) if tail.isdigit()]
+        return max(numbers, default=1) + 1
+
+    def import_batch(self, batch, stats):
+        items, item_taxes = [], []
+        for line_num, row in batch:
+            try:
+                item, taxes = self.build_item(row)
+            except (ValidationError, KeyError, TypeError) as e:
+                stats["errors"] += 1
+                message = "; ".join(e.messages) if isinstance(e, ValidationError) else str(e)
+                self.stderr.write(f"Строка {line_num}: {message}")
+                continue
+            items.append(item)
+            item_taxes.append(taxes)
+
+        # Явно указанные slug, которые уже есть в базе, не импортируются повторно
+        explicit = [item.slug for item in items if item.slug]
+        existing = set(Item.objects.filter(slug__in=explicit).values_list("slug", flat=True))
+        seen = set()
+        keep = []
+        for item, taxes in zip(items, item_taxes):
+            if item.slug:
+                if item.slug in existing or item.slug in seen:
+                    stats["skipped"] += 1
+                    continue
+                seen.add(item.slug)
+            keep.append((item, taxes))
+        if not keep:
+            return
+
+        self.assign_slugs([item for item, _ in keep if not item.slug], reserved=seen)
+        if not all(item.slug for item, _ in keep):
+            raise CommandError("Не удалось подобрать slug для товара в пачке импорта")
+        Through = Item.taxes.through
+        with transaction.atomic():
+            created = Item.objects.bulk_create([item for item, _ in keep])
+            Through.objects.bulk_create([
+                Through(item_id=item.pk, tax_id=tax_id)
+                for item, (_, taxes) in zip(created, keep) for tax_id in taxes
+            ])
+            Item.objects.filter(pk__in=[item.pk for item in created]).update_search_vector()
+
+        self.touched_categories.update(item.category_id for item in created if item.category_id)
+        stats["created"] += len(created)
@@ -0,0 +1,61 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from shop.models import StripeEvent
+from shop.webhooks import process_event
+
+
+def run(event):
+    try:
+        return process_event(event)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = """
+    Обработать события Stripe из входящей очереди вебхука.
+    События забираются пачками (FOR UPDATE SKIP LOCKED), поэтому можно запускать
+    несколько копий команды. События одного объекта Stripe обрабатываются по очереди.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=settings.STRIPE_EVENT_WORKERS,
+                            help="Число потоков обработки")
+        parser.add_argument("--batch-size", type=int, default=None,
+                            help="Событий за один захват (по умолчанию workers * 4)")
+        parser.add_argument("--poll-interval", type=float, default=2,
+                            help="Пауза (сек.), когда очередь пуста")
+        parser.add_argument("--once", action="store_true",
+                            help="Разобрать очередь и завершиться")
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        batch_size = options["batch_size"] or workers * 4
+        processed = failed = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            try:
+                while True:
+                    StripeEvent.objects.release_stale(settings.STRIPE_EVENT_LOCK_TIMEOUT)
+                    events = StripeEvent.objects.claim(batch_size)
+                    if not events:
+                        if options["once"]:
+                            break
+                        time.sleep(options["poll_interval"])
+                        continue
+                    for ok in pool.map(run, events):
+                        if ok:
+                            processed += 1
+                        else:
+                            failed += 1
+                    if options["verbosity"] > 1:
+                        self.stdout.write(f"Очередь: {StripeEvent.objects.backlog()}")
+            except KeyboardInterrupt:
+                pass
+        self.stdout.write(self.style.SUCCESS(
+            f"Обработано событий: {processed}, с ошибкой: {failed}; "
+            f"очередь: {StripeEvent.objects.backlog()}"))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.models import UserSpend
+
+
+class Command(BaseCommand):
+    help = """
+    Пересобрать суммы покупок пользователей (UserSpend) из оплаченных заказов
+    одним агрегирующим запросом. Заказам без суммы в рублях она проставляется
+    по текущему курсу.
+    """
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        users = UserSpend.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Пользователей с покупками: {users} за {time.perf_counter() - started:.2f} с"))
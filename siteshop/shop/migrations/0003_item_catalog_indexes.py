@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-18 15:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['is_available', '-created_at', 'id'], name='item_available_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['category', 'is_available', '-created_at', 'id'], name='item_cat_available_created_idx'),
+        ),
+    ]
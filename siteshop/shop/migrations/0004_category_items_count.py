@@ -0,0 +1,29 @@
+# Generated by Django 5.2.9 on 2026-10-18 15:48
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_items_count(apps, schema_editor):
+    Category = apps.get_model('shop', 'Category')
+    Item = apps.get_model('shop', 'Item')
+    available = Item.objects.filter(category=OuterRef('pk'), is_available=True).order_by(
+    ).values('category').annotate(total=Count('pk')).values('total')
+    Category.objects.update(items_count=Coalesce(Subquery(available), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_item_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Доступных товаров'),
+        ),
+        migrations.RunPython(fill_items_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.9 on 2026-10-18 15:50
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_category_items_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='item',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='item_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='item_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE shop_item SET search_vector =
+                setweight(to_tsvector('russian', coalesce(name, '')), 'A')
+                || setweight(to_tsvector('russian', coalesce(
+                    (SELECT c.name FROM shop_category c WHERE c.id = shop_item.category_id), '')), 'B')
+                || setweight(to_tsvector('russian', coalesce(description, '')), 'C')
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.9 on 2026-10-18 15:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_item_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['is_available', 'price'], name='item_available_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['currency', 'is_available', 'price'], name='item_currency_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['owner', 'is_available', '-created_at'], name='item_owner_available_idx'),
+        ),
+    ]
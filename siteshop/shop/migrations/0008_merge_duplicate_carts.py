@@ -0,0 +1,33 @@
+# Generated by Django 5.2.9 on 2026-10-18 16:03
+
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    """Оставить у пользователя самую раннюю корзину, сложив количества по товарам"""
+    Cart = apps.get_model('shop', 'Cart')
+    CartItem = apps.get_model('shop', 'CartItem')
+    duplicates = Cart.objects.values('user').annotate(
+        carts=Count('id'), keep=Min('id')).filter(carts__gt=1)
+
+    for row in duplicates:
+        lines = CartItem.objects.filter(cart__user=row['user'])
+        merged = [
+            CartItem(cart_id=row['keep'], item_id=total['item'], quantity=total['quantity'])
+            for total in lines.values('item').annotate(quantity=Sum('quantity'))
+        ]
+        lines.delete()
+        CartItem.objects.bulk_create(merged)
+        Cart.objects.filter(user=row['user']).exclude(pk=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_item_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+    ]
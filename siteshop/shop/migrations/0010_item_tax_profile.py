@@ -0,0 +1,52 @@
+# Generated by Django 5.2.9 on 2026-10-18 16:09
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+from django.db.models import Prefetch
+
+
+def build_tax_profile(taxes):
+    # Копия shop.models.build_tax_profile на момент миграции: миграция не зависит от текущего кода
+    taxes = sorted(taxes, key=lambda tax: tax.pk)
+    exclusive = [int((tax.percentage * 100).to_integral_value(ROUND_HALF_UP))
+                 for tax in taxes if not tax.inclusive]
+    return {
+        "ids": [tax.pk for tax in taxes],
+        "stripe_ids": [tax.stripe_tax_id for tax in taxes if tax.stripe_tax_id],
+        "exclusive": exclusive,
+        "exclusive_percentage": str(Decimal(sum(exclusive)).scaleb(-2)),
+        "inclusive": any(tax.inclusive for tax in taxes),
+        "labels": [f"{tax.display_name} ({tax.percentage}%)" for tax in taxes],
+    }
+
+
+def fill_tax_profiles(apps, schema_editor):
+    Item = apps.get_model('shop', 'Item')
+    Tax = apps.get_model('shop', 'Tax')
+    items = Item.objects.only('pk').order_by().prefetch_related(Prefetch('taxes', queryset=Tax.objects.only(
+        'display_name', 'percentage', 'inclusive', 'stripe_tax_id')))
+    batch = []
+    for item in items.iterator(chunk_size=2000):
+        item.tax_profile = build_tax_profile(item.taxes.all())
+        batch.append(item)
+        if len(batch) >= 2000:
+            Item.objects.bulk_update(batch, ['tax_profile'])
+            batch = []
+    Item.objects.bulk_update(batch, ['tax_profile'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_cart_unique_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='tax_profile',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Налоговый профиль'),
+        ),
+        migrations.RunPython(fill_tax_profiles, migrations.RunPython.noop),
+    ]
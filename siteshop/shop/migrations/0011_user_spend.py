@@ -0,0 +1,59 @@
+# Generated by Django 5.2.9 on 2026-10-18 16:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Заказы, оплаченные до появления учёта, пересчитываются по текущему курсу
+FILL_AMOUNT_RUB = """
+UPDATE shop_order AS o
+SET amount_rub = CASE WHEN lower(c.code) = 'rub' THEN o.total_amount
+                      ELSE round(o.total_amount * c.rate_to_rub, 2) END,
+    paid_at = o.updated_at
+FROM shop_currency AS c
+WHERE c.id = o.currency_id AND o.status = 'Paid' AND o.amount_rub IS NULL
+"""
+
+FILL_USER_SPEND = """
+INSERT INTO shop_userspend (user_id, total_rub, orders_count, updated_at)
+SELECT user_id, SUM(amount_rub), COUNT(*), now()
+FROM shop_order
+WHERE status = 'Paid'
+GROUP BY user_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_item_tax_profile'),
+        ('users', '0002_user_photo_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSpend',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='spend', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('total_rub', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Сумма покупок, ₽')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='Оплаченных заказов')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Сумма покупок',
+                'verbose_name_plural': 'Суммы покупок',
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='amount_rub',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='Сумма в рублях на момент оплаты'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='paid_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Дата оплаты'),
+        ),
+        migrations.RunSQL(FILL_AMOUNT_RUB, migrations.RunSQL.noop),
+        migrations.RunSQL(FILL_USER_SPEND, migrations.RunSQL.noop),
+    ]
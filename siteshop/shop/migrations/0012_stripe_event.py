@@ -0,0 +1,27 @@
+# Generated by Django 5.2.9 on 2026-10-18 16:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_user_spend'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True, verbose_name='ID события')),
+                ('type', models.CharField(max_length=100, verbose_name='Тип')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='Получено')),
+            ],
+            options={
+                'verbose_name': 'Событие Stripe',
+                'verbose_name_plural': 'События Stripe',
+                'ordering': ['-received_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.9 on 2026-10-18 16:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_stripe_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stripeevent',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Попыток'),
+        ),
+        migrations.AddField(
+            model_name='stripeevent',
+            name='available_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Обработать после'),
+        ),
+        migrations.AddField(
+            model_name='stripeevent',
+            name='last_error',
+            field=models.TextField(blank=True, verbose_name='Последняя ошибка'),
+        ),
+        migrations.AddField(
+            model_name='stripeevent',
+            name='locked_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Взято в обработку'),
+        ),
+        migrations.AddField(
+            model_name='stripeevent',
+            name='object_id',
+            field=models.CharField(blank=True, max_length=255, verbose_name='ID объекта Stripe'),
+        ),
+        migrations.AddField(
+            model_name='stripeevent',
+            name='payload',
+            field=models.JSONField(default=dict, verbose_name='Событие'),
+        ),
+        migrations.AddField(
+            model_name='stripeevent',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Обработано'),
+        ),
+        migrations.AddField(
+            model_name='stripeevent',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает'), ('processing', 'Обрабатывается'), ('done', 'Обработано'), ('dead', 'Ошибка, повторы исчерпаны')], default='done', max_length=20, verbose_name='Статус'),
+        ),
+        # Уже полученные события обработаны вебхуком, новые ждут обработчика
+        migrations.AlterField(
+            model_name='stripeevent',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает'), ('processing', 'Обрабатывается'), ('done', 'Обработано'), ('dead', 'Ошибка, повторы исчерпаны')], default='pending', max_length=20, verbose_name='Статус'),
+        ),
+        migrations.AddField(
+            model_name='stripeevent',
+            name='stripe_created',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Создано в Stripe'),
+        ),
+        migrations.AddIndex(
+            model_name='stripeevent',
+            index=models.Index(fields=['status', 'available_at'], name='stripe_event_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stripeevent',
+            index=models.Index(fields=['object_id', 'status'], name='stripe_event_object_idx'),
+        ),
+    ]
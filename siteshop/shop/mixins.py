@@ -1,5 +1,16 @@
+import hashlib
+
+from django.conf import settings
 from django.core.exceptions import PermissionDenied
-from .models import Cart
+from django.db.models import Q
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from rest_framework.response import Response
+from .models import Category, Currency, Item
+from .cart import get_cart
+from .forms import CatalogFilterForm, price_bucket_q
+from .pagination import KeysetPaginator
+from .cache import cache_page_response, get_cached_page, get_or_set, get_version, is_page_cacheable
 
 
 class UserOwnerMixin(object):
@@ -11,9 +22,167 @@ class UserOwnerMixin(object):
 
 
 class CartMixin:
+    """Корзина посетителя; строка в БД появляется только при первом добавлении товара"""
     def setup(self, request, *args, **kwargs):
         super().setup(request, *args, **kwargs)
+        self.cart = get_cart(request)
+
+
+class KeysetPaginationMixin:
+    """Курсорная пагинация для ListView (параметр ?cursor=)"""
+    paginate_by = 12
+    paginate_ordering = ("-created_at", "id")
+    cursor_kwarg = "cursor"
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(self.paginate_ordering, per_page=page_size)
+        page = paginator.paginate(
+            queryset, self.request.GET.get(self.cursor_kwarg))
+        return paginator, page, page.object_list, page.has_next() or page.has_previous()
+
+
+class AnonymousPageCacheMixin:
+    """Кэш страниц для анонимных посетителей с ключом по версии каталога"""
+
+    def dispatch(self, request, *args, **kwargs):
+        if not is_page_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        cached = get_cached_page(request)
+        if cached is not None:
+            return cached
+
+        response = super().dispatch(request, *args, **kwargs)
+        if hasattr(response, "render"):
+            response.render()
+        cache_page_response(request, response)
+        return response
+
+
+class SparseFieldsetMixin:
+    """Параметр ?fields=a,b для API: передаётся в сериализатор"""
+    fields_param = "fields"
+
+    def get_requested_fields(self):
+        raw = self.request.query_params.get(self.fields_param)
+        if not raw:
+            return None
+        return [name.strip() for name in raw.split(",") if name.strip()]
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault("fields", self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+
+class CatalogApiCacheMixin:
+    """Кэш сериализованных ответов API каталога с ключом по версии каталога и URL"""
+
+    def get_cached_response(self, request, build):
+        digest = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        etag = quote_etag(f"api-{get_version('catalog')}-{digest}")
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        data = get_or_set("catalog", ["api", digest], build)
+        return Response(data, headers={"ETag": etag})
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, lambda: super(CatalogApiCacheMixin, self).list(request, *args, **kwargs).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, lambda: super(CatalogApiCacheMixin, self).retrieve(request, *args, **kwargs).data)
+
+
+class CatalogFilterMixin:
+    """Фильтры каталога и счётчики фасетов (валюта, цена, категория)"""
+    filter_category = None
+
+    def get_filter_form(self):
+        if not hasattr(self, "_filter_form"):
+            self._filter_form = CatalogFilterForm(self.request.GET or None)
+        return self._filter_form
+
+    def get_catalog_filters(self):
+        filters = self.get_filter_form().get_filters()
+        if self.filter_category is not None:
+            filters["category"] = Q(category=self.filter_category)
+        return filters
+
+    def filter_queryset(self, queryset):
+        for condition in self.get_catalog_filters().values():
+            queryset = queryset.filter(condition)
+        return queryset
+
+    def _query_url(self, path="", **params):
+        query = self.request.GET.copy()
+        query.pop(getattr(self, "cursor_kwarg", "cursor"), None)
+        for key, value in params.items():
+            if value is None:
+                query.pop(key, None)
+            else:
+                query[key] = value
+        return f"{path}?{query.urlencode()}" if query else path or "?"
+
+    def get_facets(self):
+        categories = get_or_set("categories", ["sidebar"], lambda: list(
+            Category.objects.filter(items_count__gt=0).order_by("name")))
+        currencies = get_or_set("catalog", ["currencies"], lambda: list(
+            Currency.objects.filter(is_active=True)))
+        buckets = settings.CATALOG_PRICE_BUCKETS
+
+        facets = {
+            "category": {c.slug: Q(category_id=c.pk) for c in categories},
+            "currency": {c.code: Q(currency_id=c.pk) for c in currencies},
+            "price": {},
+        }
+        form = self.get_filter_form()
+        price_currency = form.price_currency_q()
+        for index, (low, high) in enumerate(buckets):
+            facets["price"][str(index)] = price_bucket_q(low, high) & price_currency
+
+        params = self.request.GET.copy()
+        params.pop(getattr(self, "cursor_kwarg", "cursor"), None)
+        digest = hashlib.md5(params.urlencode().encode()).hexdigest()
+        counts = get_or_set(
+            "catalog", ["facets", getattr(self.filter_category, "pk", 0), digest],
+            lambda: Item.published.facet_counts(self.get_catalog_filters(), facets))
+
+        data = form.get_valid_data()
+        selected_currency = data.get("currency")
+        return {
+            "total": counts["total"],
+            "categories": [{
+                "label": c.name,
+                "count": counts["category"].get(c.slug, 0),
+                "url": self._query_url(c.get_absolute_url()),
+                "selected": c == self.filter_category,
+            } for c in categories],
+            "currencies": [{
+                "label": f"{c.code} ({c.symbol})",
+                "count": counts["currency"].get(c.code, 0),
+                "url": self._query_url(currency=None if c == selected_currency else c.code),
+                "selected": c == selected_currency,
+            } for c in currencies],
+            "prices": [self._price_facet(data, counts, index, low, high, form.get_price_currency())
+                       for index, (low, high) in enumerate(buckets)],
+        }
+
+    def _price_facet(self, data, counts, index, low, high, currency):
+        selected = data.get("price_range") == index
+        label = f"от {low}" if high is None else f"{low} – {high}"
+        return {
+            "label": f"{label} {currency.symbol}" if currency is not None else label,
+            "count": counts["price"][str(index)],
+            "url": (self._query_url(price_range=None) if selected
+                    else self._query_url(price_range=index, price_min=None, price_max=None)),
+            "selected": selected,
+        }
 
-        if request.user.is_authenticated:
-            self.cart, created = Cart.objects.get_or_create(user=request.user)
-            self.cart_created = created
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["filter_form"] = self.get_filter_form()
+        context["facets"] = self.get_facets()
+        context["reset_filters_url"] = self.request.path
+        return context
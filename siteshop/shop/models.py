@@ -1,9 +1,21 @@
-from django.db import models
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connections, models, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Cast, Coalesce, Substr
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, SearchVectorField, TrigramSimilarity
 from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils import timezone
 from users.validators import RussianValidator
+from .cache import invalidate_cart_badge
+from .money import Money, basis_points
+from .stripe_gateway import gateway
+from .utils import currency_table
 import stripe
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
@@ -38,7 +50,7 @@ class Tax(models.Model):
     def save(self, *args, **kwargs):
         try:
             if not self.stripe_tax_id:
-                tax_rate = stripe.TaxRate.create(
+                tax_rate = gateway.call("tax_rates.create", params=dict(
                     display_name=self.display_name,
                     percentage=float(self.percentage),
                     inclusive=self.inclusive,
@@ -47,20 +59,19 @@ class Tax(models.Model):
                     description=self.description if self.description else None,
                     jurisdiction=self.jurisdiction if self.jurisdiction else None,
                     state=self.state if self.state else None,
-                )
+                ))
 
                 self.stripe_tax_id = tax_rate.id
 
             else:
-                stripe.TaxRate.modify(
-                    self.stripe_tax_id,
+                gateway.call("tax_rates.update", self.stripe_tax_id, params=dict(
                     display_name=self.display_name,
                     active=self.active,
                     description=self.description,
                     country=self.country,
                     jurisdiction=self.jurisdiction,
                     state=self.state,
-                )
+                ))
 
             super().save(*args, **kwargs)
 
@@ -70,10 +81,7 @@ class Tax(models.Model):
     def delete(self, *args, **kwargs):
         try:
             if self.stripe_tax_id:
-                stripe.TaxRate.modify(
-                    self.stripe_tax_id,
-                    active=False
-                )
+                gateway.call("tax_rates.update", self.stripe_tax_id, params={"active": False})
                 self.active = False
                 self.save()
             super().delete(*args, **kwargs)
@@ -86,7 +94,103 @@ class Tax(models.Model):
         verbose_name_plural = "Налоги"
 
 
-class PublishedManager(models.Manager):
+def build_tax_profile(taxes):
+    """
+    Налоговый профиль товара для расчёта и оплаты без запросов к налогам:
+    ставки исключающих налогов в сотых долях процента (Money.percent),
+    их сумма, признак включённого в цену налога и id для Stripe.
+    """
+    taxes = sorted(taxes, key=lambda tax: tax.pk)
+    exclusive = [basis_points(tax.percentage) for tax in taxes if not tax.inclusive]
+    return {
+        "ids": [tax.pk for tax in taxes],
+        "stripe_ids": [tax.stripe_tax_id for tax in taxes if tax.stripe_tax_id],
+        "exclusive": exclusive,
+        "exclusive_percentage": str(Decimal(sum(exclusive)).scaleb(-2)),
+        "inclusive": any(tax.inclusive for tax in taxes),
+        "labels": [f"{tax.display_name} ({tax.percentage}%)" for tax in taxes],
+    }
+
+
+class ItemQuerySet(models.QuerySet):
+    CARD_FIELDS = ("name", "slug", "price", "image", "image_variants", "created_at",
+                   "category__name", "category__slug",
+                   "currency__symbol", "owner__first_name")
+
+    def cards(self):
+        """Проекция для карточек каталога: только нужные шаблону поля за один запрос"""
+        return self.select_related("category", "currency", "owner").only(
+            *self.CARD_FIELDS).annotate(short_description=Substr("description", 1, 40))
+
+    def search(self, query):
+        """
+        Полнотекстовый поиск с ранжированием и триграммным поиском по названию для опечаток.
+        rank округляется до numeric: по нему идёт курсорная пагинация, а значение float
+        после JSON не совпадает с тем, что сравнивает PostgreSQL.
+        """
+        search_query = SearchQuery(
+            query, config=settings.SEARCH_CONFIG, search_type="websearch")
+        return self.annotate(
+            rank=Cast(SearchRank(F("search_vector"), search_query) + TrigramSimilarity("name", query),
+                      models.DecimalField(max_digits=12, decimal_places=6))
+        ).filter(models.Q(search_vector=search_query) | models.Q(name__trigram_similar=query))
+
+    def facet_counts(self, filters, facets):
+        """
+        Количество товаров по значениям фасетов одним агрегирующим запросом.
+        filters - условия по группам, facets - {группа: {значение: условие}}.
+        Счётчик значения учитывает все фильтры, кроме фильтра своей группы.
+        """
+        def combined(exclude=None):
+            condition = models.Q()
+            for group, q in filters.items():
+                if group != exclude:
+                    condition &= q
+            return condition
+
+        aggregates = {"total": models.Count("pk", filter=combined())}
+        aliases = {}
+        for group, values in facets.items():
+            scope = combined(exclude=group)
+            for value, q in values.items():
+                alias = f"facet_{len(aliases)}"
+                aliases[alias] = (group, value)
+                aggregates[alias] = models.Count("pk", filter=scope & q)
+
+        counts = self.aggregate(**aggregates)
+        result = {"total": counts["total"]}
+        for alias, (group, value) in aliases.items():
+            result.setdefault(group, {})[value] = counts[alias]
+        return result
+
+    def refresh_tax_profile(self, chunk_size=2000):
+        """Пересчитать Item.tax_profile по текущим налогам (пачками)"""
+        items = self.only("pk").order_by().prefetch_related(
+            models.Prefetch("taxes", queryset=Tax.objects.only(
+                "display_name", "percentage", "inclusive", "stripe_tax_id")))
+        batch = []
+        for item in items.iterator(chunk_size=chunk_size):
+            item.tax_profile = build_tax_profile(item.taxes.all())
+            batch.append(item)
+            if len(batch) >= chunk_size:
+                Item.objects.bulk_update(batch, ["tax_profile"])
+                batch = []
+        if batch:
+            Item.objects.bulk_update(batch, ["tax_profile"])
+
+    def update_search_vector(self):
+        """Пересчитать поисковый вектор: название, категория, описание"""
+        category_name = Subquery(Category.objects.filter(
+            pk=OuterRef("category_id")).values("name")[:1])
+        config = settings.SEARCH_CONFIG
+        return self.update(search_vector=(
+            SearchVector("name", weight="A", config=config)
+            + SearchVector(category_name, weight="B", config=config)
+            + SearchVector("description", weight="C", config=config)
+        ))
+
+
+class PublishedManager(models.Manager.from_queryset(ItemQuerySet)):
     def get_queryset(self):
         return super().get_queryset().filter(is_available=True)
 
@@ -117,6 +221,9 @@ class Item(models.Model):
     image = models.ImageField(
         upload_to='items/%Y/%m/%d/', blank=True, verbose_name="Изображение")
 
+    image_variants = models.JSONField(
+        default=dict, blank=True, editable=False, verbose_name="Варианты изображения")
+
     category = models.ForeignKey('Category', on_delete=models.SET_NULL,
                                  null=True, related_name="items", verbose_name="Категория")
 
@@ -137,13 +244,33 @@ class Item(models.Model):
         verbose_name="Налоги",
     )
 
-    objects = models.Manager()
+    tax_profile = models.JSONField(
+        default=dict, blank=True, editable=False, verbose_name="Налоговый профиль")
+
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ItemQuerySet.as_manager()
     published = PublishedManager()
 
     class Meta:
         verbose_name = "Товар"
         verbose_name_plural = "Товары"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["is_available", "-created_at", "id"],
+                         name="item_available_created_idx"),
+            models.Index(fields=["category", "is_available", "-created_at", "id"],
+                         name="item_cat_available_created_idx"),
+            models.Index(fields=["is_available", "price"],
+                         name="item_available_price_idx"),
+            models.Index(fields=["currency", "is_available", "price"],
+                         name="item_currency_price_idx"),
+            models.Index(fields=["owner", "is_available", "-created_at"],
+                         name="item_owner_available_idx"),
+            GinIndex(fields=["search_vector"], name="item_search_vector_idx"),
+            GinIndex(fields=["name"], name="item_name_trgm_idx",
+                     opclasses=["gin_trgm_ops"]),
+        ]
 
     def get_absolute_url(self):
         return reverse("item", kwargs={"item_slug": self.slug})
@@ -152,6 +279,15 @@ class Item(models.Model):
         return self.name
 
 
+class CategoryQuerySet(models.QuerySet):
+    def refresh_items_count(self):
+        """Полный пересчёт счётчиков доступных товаров"""
+        available = Item.objects.filter(
+            category=OuterRef("pk"), is_available=True
+        ).order_by().values("category").annotate(total=models.Count("pk")).values("total")
+        return self.update(items_count=Coalesce(Subquery(available), 0))
+
+
 class Category(models.Model):
     """Модель категории товаров"""
     name = models.CharField(max_length=100, unique=True,
@@ -159,6 +295,11 @@ class Category(models.Model):
 
     slug = models.SlugField(max_length=100, unique=True, verbose_name="URL")
 
+    items_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Доступных товаров")
+
+    objects = CategoryQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Категория"
         verbose_name_plural = "Категории"
@@ -246,21 +387,19 @@ class Discount(models.Model):
                 }
 
                 if self.amount_off:
-                    coupon_params['amount_off'] = int(self.amount_off * 100)
-                    coupon_params['currency'] = self.currency.lower()
+                    amount_off = Money.from_decimal(self.amount_off, self.currency.code)
+                    coupon_params['amount_off'] = amount_off.stripe_amount
+                    coupon_params['currency'] = amount_off.currency
                 else:
                     coupon_params['percent_off'] = float(self.percent_off)
 
                 if self.duration == 'repeating' and self.duration_in_months:
                     coupon_params['duration_in_months'] = self.duration_in_months
 
-                coupon = stripe.Coupon.create(**coupon_params)
+                coupon = gateway.call("coupons.create", params=coupon_params)
                 self.stripe_coupon_id = coupon.id
             else:
-                stripe.Coupon.modify(
-                    self.stripe_coupon_id,
-                    name=self.name
-                )
+                gateway.call("coupons.update", self.stripe_coupon_id, params={"name": self.name})
             super().save(*args, **kwargs)
 
         except Exception as e:
@@ -269,7 +408,7 @@ class Discount(models.Model):
     def delete(self, *args, **kwargs):
         try:
             if self.stripe_coupon_id:
-                stripe.Coupon.delete(self.stripe_coupon_id)
+                gateway.call("coupons.delete", self.stripe_coupon_id)
         except Exception as e:
             raise ValidationError(f'Ошибка при удалении: {e}')
 
@@ -281,6 +420,13 @@ class Discount(models.Model):
         ordering = ['-created_at']
 
 
+class CartQuerySet(models.QuerySet):
+    def for_user(self, user):
+        """Корзина пользователя; при гонке get_or_create опирается на уникальность user"""
+        cart, created = self.get_or_create(user=user)
+        return cart
+
+
 class Cart(models.Model):
     """Модель корзины"""
     user = models.ForeignKey(
@@ -290,39 +436,120 @@ class Cart(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CartQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Корзина"
         verbose_name_plural = "Корзины"
+        constraints = [
+            models.UniqueConstraint(fields=["user"], name="cart_unique_user"),
+        ]
 
     def __str__(self):
         return f"Корзина {self.user.username}"
 
+    def get_summary(self):
+        """Итоги корзины за фиксированное число запросов (см. shop.pricing)"""
+        from .pricing import get_cart_summary
+        return get_cart_summary(self)
+
     def get_total_price(self):
         """Сумма без налогов"""
-        total = 0
-        for cart_item in self.items.all():
-            total += cart_item.calculate_total_price()
-        return total
+        return self.get_summary().total_price
 
     def get_total_price_with_taxes(self):
         """Сумма с налогами"""
-        total = 0
-        for cart_item in self.items.all():
-            total += cart_item.calculate_total_price_with_taxes()
-        return total
+        return self.get_summary().total_with_taxes
 
     def get_tax_amount(self):
         """Общая сумма налогов в корзине"""
-        total = 0
-        for cart_item in self.items.all():
-            total += cart_item.get_tax_amount()
-        return total
+        return self.get_summary().tax_amount
 
     def get_total_quantity(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.get_summary().total_quantity
 
     def is_empty(self):
-        return self.items.count() == 0
+        return self._state.adding or not self.items.exists()
+
+    def _ensure_saved(self):
+        """Строка корзины создаётся только при первом добавлении товара"""
+        if self._state.adding:
+            saved = Cart.objects.for_user(self.user)
+            self.pk, self.created_at = saved.pk, saved.created_at
+            self._state.adding = False
+
+    def get_quantity(self, item):
+        if self._state.adding:
+            return 0
+        return self.items.filter(item=item).values_list("quantity", flat=True).first() or 0
+
+    def add(self, item, quantity):
+        """Атомарное прибавление количества одним запросом"""
+        self._ensure_saved()
+        CartItem.objects.add_quantities(self, {item.pk: quantity})
+        invalidate_cart_badge(self.user_id)
+        return True
+
+    def set_quantity(self, item, quantity):
+        if self._state.adding:
+            return
+        if quantity > 0:
+            self.items.filter(item=item).update(quantity=quantity)
+        else:
+            self.items.filter(item=item).delete()
+        invalidate_cart_badge(self.user_id)
+
+    def set_quantities(self, quantities):
+        """
+        Пакетное изменение {id товара: шт.} в одной транзакции:
+        нулевые позиции удаляются, остальные записываются одним upsert.
+        """
+        if self._state.adding and not any(quantity > 0 for quantity in quantities.values()):
+            return
+        self._ensure_saved()
+        with transaction.atomic():
+            removed = [pk for pk, quantity in quantities.items() if quantity <= 0]
+            if removed:
+                self.items.filter(item_id__in=removed).delete()
+            CartItem.objects.bulk_create(
+                [CartItem(cart=self, item_id=pk, quantity=quantity)
+                 for pk, quantity in quantities.items() if quantity > 0],
+                update_conflicts=True,
+                unique_fields=["cart", "item"],
+                update_fields=["quantity"],
+            )
+        invalidate_cart_badge(self.user_id)
+
+    def remove(self, item):
+        self.set_quantity(item, 0)
+
+    def clear(self):
+        if not self._state.adding:
+            self.items.all().delete()
+            invalidate_cart_badge(self.user_id)
+
+
+class CartItemQuerySet(models.QuerySet):
+    def add_quantities(self, cart, quantities):
+        """
+        Прибавить количества {id товара: шт.} к корзине одним INSERT ... ON CONFLICT.
+        Несуществующие товары отбрасываются соединением с таблицей товаров.
+        """
+        if not quantities:
+            return
+        table = self.model._meta.db_table
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (cart_id, item_id, quantity)
+                SELECT %s, item.id, new.quantity
+                FROM unnest(%s::bigint[], %s::integer[]) AS new(item_id, quantity)
+                JOIN {Item._meta.db_table} AS item ON item.id = new.item_id
+                ON CONFLICT (cart_id, item_id)
+                DO UPDATE SET quantity = {table}.quantity + EXCLUDED.quantity
+                """,
+                [cart.pk, list(quantities), list(quantities.values())],
+            )
 
 
 class CartItem(models.Model):
@@ -332,6 +559,8 @@ class CartItem(models.Model):
     item = models.ForeignKey(Item, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
         unique_together = ['cart', 'item']
         verbose_name = "Товары в корзине"
@@ -346,25 +575,13 @@ class CartItem(models.Model):
 
     def calculate_total_price_with_taxes(self):
         """Цена с налогами"""
-        base_price = self.calculate_total_price()
-        total_tax = 0
-
-        for tax in self.item.taxes.all():
-            if not tax.inclusive:
-                total_tax += base_price * (tax.percentage / 100)
-
-        return base_price + total_tax
+        from .pricing import CartLine
+        return CartLine(self).total_with_taxes.amount
 
     def get_tax_amount(self):
         """Сумма налогов для этого товара"""
-        base_price = self.calculate_total_price()
-        total_tax = 0
-
-        for tax in self.item.taxes.all():
-            if not tax.inclusive:
-                total_tax += base_price * (tax.percentage / 100)
-
-        return total_tax
+        from .pricing import CartLine
+        return CartLine(self).tax_amount.amount
 
 
 class Order(models.Model):
@@ -418,6 +635,18 @@ class Order(models.Model):
         related_name='orders'
     )
 
+    amount_rub = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Сумма в рублях на момент оплаты"
+    )
+
+    paid_at = models.DateTimeField(null=True, blank=True, editable=False,
+                                   verbose_name="Дата оплаты")
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -429,6 +658,234 @@ class Order(models.Model):
     def __str__(self):
         return f"Заказ #{self.id} - {self.user.username}"
 
+    def mark_paid(self):
+        """
+        Перевести заказ в Paid и прибавить его сумму в рублях (по курсу на момент оплаты)
+        к UserSpend. Условный UPDATE гарантирует, что повторный вызов ничего не удвоит.
+        Возвращает True, если статус изменён этим вызовом.
+        """
+        info = currency_table.by_id(self.currency_id)
+        amount_rub = currency_table.to_rubles(self.total_amount, info.code if info else None)
+        now = timezone.now()
+        with transaction.atomic():
+            updated = Order.objects.filter(pk=self.pk).exclude(status='Paid').update(
+                status='Paid', amount_rub=amount_rub, paid_at=now, updated_at=now)
+            if updated:
+                UserSpend.objects.add(self.user_id, amount_rub)
+        if updated:
+            self.status, self.amount_rub, self.paid_at, self.updated_at = 'Paid', amount_rub, now, now
+        return bool(updated)
+
+
+class StripeEventQuerySet(models.QuerySet):
+    def claim(self, limit):
+        """
+        Забрать до limit событий в обработку (FOR UPDATE SKIP LOCKED).
+        По каждому объекту Stripe выдаётся только самое раннее событие
+        и только если более раннее не обрабатывается сейчас и не ждёт повтора.
+        """
+        now = timezone.now()
+        earlier = models.Q(stripe_created__lt=OuterRef("stripe_created")) | models.Q(
+            stripe_created=OuterRef("stripe_created"), pk__lt=OuterRef("pk"))
+        blocking = StripeEvent.objects.filter(object_id=OuterRef("object_id")).exclude(
+            object_id="").filter(
+            models.Q(status=StripeEvent.PROCESSING) | models.Q(status=StripeEvent.PENDING) & earlier)
+        with transaction.atomic(using=self.db):
+            ids = list(self.filter(status=StripeEvent.PENDING, available_at__lte=now)
+                       .exclude(models.Exists(blocking))
+                       .order_by("stripe_created", "pk")
+                       .select_for_update(skip_locked=True)
+                       .values_list("pk", flat=True)[:limit])
+            self.filter(pk__in=ids).update(
+                status=StripeEvent.PROCESSING, locked_at=now, attempts=F("attempts") + 1)
+        return list(self.filter(pk__in=ids).order_by("stripe_created", "pk"))
+
+    def release_stale(self, timeout):
+        """Вернуть в очередь события, брошенные упавшим обработчиком"""
+        return self.filter(status=StripeEvent.PROCESSING,
+                           locked_at__lt=timezone.now() - timedelta(seconds=timeout)).update(
+            status=StripeEvent.PENDING, locked_at=None)
+
+    def backlog(self):
+        """Глубина очереди и возраст самого старого ожидающего события (сек.)"""
+        counts = self.aggregate(
+            pending=models.Count("pk", filter=models.Q(status=StripeEvent.PENDING)),
+            processing=models.Count("pk", filter=models.Q(status=StripeEvent.PROCESSING)),
+            dead=models.Count("pk", filter=models.Q(status=StripeEvent.DEAD)),
+            oldest=models.Min("received_at", filter=models.Q(status=StripeEvent.PENDING)),
+        )
+        oldest = counts.pop("oldest")
+        counts["oldest_pending_seconds"] = round(
+            (timezone.now() - oldest).total_seconds(), 1) if oldest else 0
+        return counts
+
+
+class StripeEvent(models.Model):
+    """
+    Входящая очередь событий вебхука Stripe: вебхук только сохраняет событие,
+    обрабатывает его manage.py process_stripe_events. Уникальный id отсекает повторы.
+    """
+    PENDING, PROCESSING, DONE, DEAD = "pending", "processing", "done", "dead"
+    STATUS_CHOICES = [
+        (PENDING, 'Ожидает'),
+        (PROCESSING, 'Обрабатывается'),
+        (DONE, 'Обработано'),
+        (DEAD, 'Ошибка, повторы исчерпаны'),
+    ]
+
+    event_id = models.CharField(max_length=255, unique=True, verbose_name="ID события")
+    type = models.CharField(max_length=100, verbose_name="Тип")
+    object_id = models.CharField(max_length=255, blank=True, verbose_name="ID объекта Stripe")
+    payload = models.JSONField(default=dict, verbose_name="Событие")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING,
+                              verbose_name="Статус")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    stripe_created = models.DateTimeField(null=True, blank=True, verbose_name="Создано в Stripe")
+    received_at = models.DateTimeField(auto_now_add=True, verbose_name="Получено")
+    available_at = models.DateTimeField(default=timezone.now, verbose_name="Обработать после")
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="Взято в обработку")
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name="Обработано")
+
+    objects = StripeEventQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Событие Stripe"
+        verbose_name_plural = "События Stripe"
+        ordering = ['-received_at']
+        indexes = [
+            models.Index(fields=["status", "available_at"], name="stripe_event_queue_idx"),
+            models.Index(fields=["object_id", "status"], name="stripe_event_object_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.event_id}"
+
+
+class DataVersionQuerySet(models.QuerySet):
+    def current(self, name):
+        """(версия, время изменения) набора данных; отсутствующий набор заводится с версией 1"""
+        row = self.filter(name=name).values_list("version", "modified_at").first()
+        if row is None:
+            obj, _ = self.get_or_create(name=name)
+            row = (obj.version, obj.modified_at)
+        return row
+
+    def bump(self, name):
+        """Атомарно увеличить версию одним INSERT ... ON CONFLICT; возвращает (версия, время)"""
+        table = self.model._meta.db_table
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (name, version, modified_at) VALUES (%s, 2, %s)
+                ON CONFLICT (name)
+                DO UPDATE SET version = {table}.version + 1, modified_at = EXCLUDED.modified_at
+                RETURNING version, modified_at
+                """,
+                [name, timezone.now()],
+            )
+            return cursor.fetchone()
+
+
+class DataVersion(models.Model):
+    """
+    Версия набора данных для ключей кэша (см. shop.cache): общая для всех процессов,
+    увеличивается атомарно и никогда не вытесняется.
+    """
+    name = models.CharField(max_length=50, primary_key=True, verbose_name="Набор данных")
+    version = models.PositiveBigIntegerField(default=1, verbose_name="Версия")
+    modified_at = models.DateTimeField(default=timezone.now, verbose_name="Изменён")
+
+    objects = DataVersionQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Версия данных"
+        verbose_name_plural = "Версии данных"
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class UserSpendQuerySet(models.QuerySet):
+    def add(self, user_id, amount_rub):
+        """Прибавить оплаченный заказ к итогу пользователя одним INSERT ... ON CONFLICT"""
+        table = self.model._meta.db_table
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (user_id, total_rub, orders_count, updated_at)
+                VALUES (%s, %s, 1, now())
+                ON CONFLICT (user_id) DO UPDATE SET
+                    total_rub = {table}.total_rub + EXCLUDED.total_rub,
+                    orders_count = {table}.orders_count + 1,
+                    updated_at = EXCLUDED.updated_at
+                """,
+                [user_id, amount_rub],
+            )
+
+    def rebuild(self):
+        """
+        Пересобрать таблицу из оплаченных заказов одним агрегирующим запросом.
+        Заказам без amount_rub (оплаченным до появления учёта) сумма
+        проставляется по текущему курсу.
+        """
+        table = self.model._meta.db_table
+        orders = Order._meta.db_table
+        currencies = Currency._meta.db_table
+        with transaction.atomic(using=self.db), connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {orders} AS o
+                SET amount_rub = CASE WHEN lower(c.code) = 'rub' THEN o.total_amount
+                                      ELSE round(o.total_amount * c.rate_to_rub, 2) END,
+                    paid_at = COALESCE(o.paid_at, o.updated_at)
+                FROM {currencies} AS c
+                WHERE c.id = o.currency_id AND o.status = 'Paid' AND o.amount_rub IS NULL
+                """
+            )
+            cursor.execute(f"DELETE FROM {table}")
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (user_id, total_rub, orders_count, updated_at)
+                SELECT user_id, SUM(amount_rub), COUNT(*), now()
+                FROM {orders}
+                WHERE status = 'Paid'
+                GROUP BY user_id
+                """
+            )
+            return cursor.rowcount
+
+
+class UserSpend(models.Model):
+    """Сумма оплаченных заказов пользователя в рублях, обновляется при оплате"""
+    user = models.OneToOneField(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='spend',
+        verbose_name="Пользователь"
+    )
+
+    total_rub = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="Сумма покупок, ₽"
+    )
+
+    orders_count = models.PositiveIntegerField(default=0, verbose_name="Оплаченных заказов")
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = UserSpendQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Сумма покупок"
+        verbose_name_plural = "Суммы покупок"
+
+    def __str__(self):
+        return f"{self.user_id}: {self.total_rub} ₽"
+
 
 class OrderItem(models.Model):
     """Товары в заказе"""
@@ -565,12 +1022,5 @@ class Currency(models.Model):
 
     @classmethod
     def convert_amount_to_rubles(cls, amount, currency_code):
-        """Конвертировать сумму в рубли."""
-        try:
-            currency = cls.objects.get(code__iexact=currency_code)
-            amount_in_main_unit = float(amount)
-            if currency.code.lower() == 'rub':
-                return amount_in_main_unit
-            return amount_in_main_unit * float(currency.rate_to_rub)
-        except cls.DoesNotExist:
-            return 0
+        """Конвертировать сумму в рубли (Decimal, до копеек) по таблице валют процесса."""
+        return currency_table.to_rubles(amount, currency_code)
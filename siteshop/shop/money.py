@@ -0,0 +1,130 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+# Число знаков после запятой у валют, где оно отличается от 2 (правила Stripe)
+CURRENCY_EXPONENTS = {
+    **dict.fromkeys(("bif", "clp", "djf", "gnf", "jpy", "kmf", "krw", "mga", "pyg",
+                     "rwf", "ugx", "vnd", "vuv", "xaf", "xof", "xpf"), 0),
+    **dict.fromkeys(("bhd", "jod", "kwd", "omr", "tnd"), 3),
+}
+DEFAULT_EXPONENT = 2
+
+
+def exponent(currency):
+    return CURRENCY_EXPONENTS.get((currency or "").lower(), DEFAULT_EXPONENT)
+
+
+def basis_points(percentage):
+    """Процент (Decimal с двумя знаками) в сотых долях процента: 20.00 -> 2000"""
+    return int((Decimal(percentage) * 100).to_integral_value(ROUND_HALF_UP))
+
+
+def div_round(numerator, denominator):
+    """Целочисленное деление с округлением половины от нуля"""
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if remainder * 2 >= denominator:
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+
+class Money:
+    """
+    Сумма в минимальных единицах валюты (копейки, центы, иены).
+    Вся арифметика целочисленная; Decimal нужен только на входе и при выводе.
+    """
+    __slots__ = ("minor", "currency")
+
+    def __init__(self, minor, currency):
+        self.minor = int(minor)
+        self.currency = (currency or "").lower()
+
+    @classmethod
+    def from_decimal(cls, amount, currency, rounding=ROUND_HALF_UP):
+        minor = Decimal(amount).scaleb(exponent(currency)).to_integral_value(rounding)
+        return cls(minor, currency)
+
+    @classmethod
+    def zero(cls, currency):
+        return cls(0, currency)
+
+    @property
+    def exponent(self):
+        return exponent(self.currency)
+
+    @property
+    def amount(self):
+        """Сумма в основных единицах как Decimal (для БД и отображения)"""
+        return Decimal(self.minor).scaleb(-self.exponent)
+
+    @property
+    def stripe_amount(self):
+        """Сумма для Stripe: у трёхзначных валют последняя цифра должна быть 0"""
+        if self.exponent == 3:
+            return div_round(self.minor, 10) * 10
+        return self.minor
+
+    def percent(self, points):
+        """Доля суммы по ставке в сотых долях процента (см. basis_points)"""
+        return Money(div_round(self.minor * points, 10000), self.currency)
+
+    def _other(self, other):
+        if isinstance(other, Money):
+            if other.currency != self.currency:
+                raise ValueError(f"Разные валюты: {self.currency} и {other.currency}")
+            return other.minor
+        if other == 0:
+            return 0
+        return NotImplemented
+
+    def __add__(self, other):
+        minor = self._other(other)
+        if minor is NotImplemented:
+            return NotImplemented
+        return Money(self.minor + minor, self.currency)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        minor = self._other(other)
+        if minor is NotImplemented:
+            return NotImplemented
+        return Money(self.minor - minor, self.currency)
+
+    def __mul__(self, quantity):
+        if not isinstance(quantity, int):
+            return NotImplemented
+        return Money(self.minor * quantity, self.currency)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money(-self.minor, self.currency)
+
+    def __bool__(self):
+        return self.minor != 0
+
+    def __eq__(self, other):
+        if isinstance(other, Money):
+            return self.minor == other.minor and self.currency == other.currency
+        return other == 0 and self.minor == 0
+
+    def __hash__(self):
+        return hash((self.minor, self.currency))
+
+    def __lt__(self, other):
+        return self.minor < self._other(other)
+
+    def __le__(self, other):
+        return self.minor <= self._other(other)
+
+    def __gt__(self, other):
+        return self.minor > self._other(other)
+
+    def __ge__(self, other):
+        return self.minor >= self._other(other)
+
+    def __str__(self):
+        # Строка вида "123.45": её понимают floatformat и DecimalField в DRF
+        return f"{self.amount:.{self.exponent}f}"
+
+    def __repr__(self):
+        return f"Money({self.minor}, {self.currency!r})"
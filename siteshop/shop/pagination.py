@@ -0,0 +1,137 @@
+import base64
+import json
+from decimal import Decimal
+
+from django.db.models import Q
+from django.http import Http404
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPage:
+    """Страница курсорной (keyset) пагинации"""
+
+    def __init__(self, object_list, next_cursor=None, cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Курсорная пагинация по набору полей сортировки.
+    Курсор хранит значения полей последнего объекта страницы,
+    поэтому стоимость страницы не зависит от глубины прокрутки.
+    """
+
+    def __init__(self, ordering=("-created_at", "id"), per_page=12):
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+
+    @staticmethod
+    def _field(name):
+        return name.lstrip("-")
+
+    def encode_cursor(self, obj):
+        values = []
+        for name in self.ordering:
+            value = getattr(obj, self._field(name))
+            if hasattr(value, "isoformat"):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        raw = json.dumps(values, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (ValueError, TypeError):
+            raise Http404("Неверный курсор страницы")
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise Http404("Неверный курсор страницы")
+        return values
+
+    def _after(self, values):
+        """Условие "строго после курсора" для составной сортировки"""
+        condition = Q()
+        equal = Q()
+        for name, value in zip(self.ordering, values):
+            field = self._field(name)
+            lookup = "lt" if name.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{field}__{lookup}": value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def paginate(self, queryset, cursor=None):
+        queryset = queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(self._after(self.decode_cursor(cursor)))
+
+        objects = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(objects) > self.per_page:
+            objects = objects[:self.per_page]
+            next_cursor = self.encode_cursor(objects[-1])
+        return KeysetPage(objects, next_cursor=next_cursor, cursor=cursor or None)
+
+
+class KeysetApiPagination(BasePagination):
+    """
+    Курсорная пагинация для DRF на основе KeysetPaginator.
+    Сортировку берёт из атрибута представления paginate_ordering.
+    """
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    ordering = ("-created_at", "id")
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = KeysetPaginator(
+            getattr(view, "paginate_ordering", self.ordering), self.get_page_size(request))
+        self.page = paginator.paginate(
+            queryset, request.query_params.get(self.cursor_query_param))
+        return list(self.page)
+
+    def get_next_link(self):
+        if not self.page.has_next():
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, self.page.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,137 @@
+from decimal import Decimal
+
+from .models import OrderItem
+from .money import Money
+
+
+def with_pricing(cart_items):
+    """
+    Подгрузка всего нужного для расчёта: товар и валюта.
+    Налоги берутся из Item.tax_profile, поэтому это один запрос.
+    """
+    return cart_items.select_related("item", "item__currency")
+
+
+def with_item_pricing(items):
+    """То же для запроса по товарам (гостевая корзина)"""
+    return items.select_related("currency")
+
+
+class CartLine:
+    """Строка корзины с посчитанными суммами (Money, целые минимальные единицы)"""
+
+    def __init__(self, cart_item):
+        self.cart_item = cart_item
+        self.item = cart_item.item
+        self.quantity = cart_item.quantity
+        profile = self.item.tax_profile or {}
+        self.tax_ids = profile.get("ids", [])
+        self.stripe_tax_ids = profile.get("stripe_ids", [])
+        self.tax_labels = profile.get("labels", [])
+        currency = self.item.currency.code
+        self.unit_price = Money.from_decimal(self.item.price, currency)
+        self.total = self.unit_price * self.quantity
+        # Налог считается от суммы строки по каждой ставке, как у Stripe для tax_rates
+        self.tax_amount = sum(
+            (self.total.percent(points) for points in profile.get("exclusive", [])),
+            Money.zero(currency))
+        self.total_with_taxes = self.total + self.tax_amount
+
+    @property
+    def name(self):
+        return self.item.name
+
+    @property
+    def price(self):
+        return self.item.price
+
+    @property
+    def image(self):
+        return self.item.image
+
+    @property
+    def slug(self):
+        return self.item.slug
+
+
+def combine(amounts):
+    """
+    Итог по валютам {код: Money}: для одной валюты - Money,
+    для нескольких - сумма Decimal (только для показа, к оплате не принимается).
+    """
+    if len(amounts) == 1:
+        return next(iter(amounts.values()))
+    return sum((money.amount for money in amounts.values()), Decimal(0))
+
+
+class CartSummary:
+    """Итоги корзины: суммы, налоги, количество и валюты за один проход по строкам"""
+
+    def __init__(self, cart_items):
+        self.lines = []
+        self.unavailable = []
+        self.total_quantity = 0
+        currencies = {}
+        totals = {}
+        taxes = {}
+
+        for cart_item in cart_items:
+            line = CartLine(cart_item)
+            self.lines.append(line)
+            code = line.total.currency
+            totals[code] = line.total + totals.get(code, 0)
+            taxes[code] = line.tax_amount + taxes.get(code, 0)
+            self.total_quantity += line.quantity
+            currencies[line.item.currency_id] = line.item.currency
+            if not line.item.is_available:
+                self.unavailable.append(line)
+
+        self.currencies = list(currencies.values())
+        self.total_price = combine(totals)
+        self.tax_amount = combine(taxes)
+        self.total_with_taxes = combine({code: totals[code] + taxes[code] for code in totals})
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def is_empty(self):
+        return not self.lines
+
+    @property
+    def has_multiple_currencies(self):
+        return len(self.currencies) > 1
+
+    @property
+    def currency(self):
+        """Валюта корзины, если она одна"""
+        return self.currencies[0] if len(self.currencies) == 1 else None
+
+
+def get_cart_summary(cart):
+    if cart._state.adding:
+        return CartSummary([])
+    return CartSummary(with_pricing(cart.items.all()))
+
+
+def create_order_items(order, summary):
+    """Позиции заказа и их налоги двумя bulk-запросами"""
+    order_items = OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            item=line.item,
+            quantity=line.quantity,
+            price=line.item.price,
+            currency=line.item.currency,
+            item_name=line.item.name,
+        )
+        for line in summary
+    ])
+    Through = OrderItem.taxes.through
+    Through.objects.bulk_create([
+        Through(orderitem_id=order_item.pk, tax_id=tax_id)
+        for order_item, line in zip(order_items, summary) for tax_id in line.tax_ids
+    ])
+    return order_items
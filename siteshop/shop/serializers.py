@@ -0,0 +1,92 @@
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+from .models import Category, Item, Tax
+
+
+class SparseFieldsetSerializer(serializers.ModelSerializer):
+    """Сериализатор, отдающий только поля из параметра ?fields=name,price"""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None:
+            return
+        unknown = set(fields) - set(self.fields)
+        if unknown:
+            raise serializers.ValidationError(
+                {"fields": f"Неизвестные поля: {', '.join(sorted(unknown))}"})
+        for name in set(self.fields) - set(fields):
+            self.fields.pop(name)
+
+
+class TaxSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Tax
+        fields = ("id", "display_name", "percentage", "inclusive")
+
+
+class CategorySerializer(SparseFieldsetSerializer):
+    class Meta:
+        model = Category
+        fields = ("id", "name", "slug", "items_count")
+
+
+class ItemSerializer(SparseFieldsetSerializer):
+    category = serializers.SlugRelatedField(slug_field="slug", read_only=True)
+    currency = serializers.CharField(source="currency.code", read_only=True)
+    seller = serializers.CharField(source="owner.username", read_only=True)
+    taxes = TaxSerializer(many=True, read_only=True)
+    thumbnails = serializers.SerializerMethodField()
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Item
+        fields = ("slug", "name", "description", "price", "currency", "category",
+                  "seller", "taxes", "image", "thumbnails", "url",
+                  "created_at", "updated_at")
+
+    # Какие связи нужны полям: по ним view выбирает select_related/prefetch_related
+    RELATED_FIELDS = {"category": "category", "currency": "currency", "seller": "owner"}
+    PREFETCH_FIELDS = {"taxes": "taxes"}
+
+    def _absolute(self, url):
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
+    def get_thumbnails(self, item):
+        return [{"width": size["width"],
+                 "webp": self._absolute(default_storage.url(size["webp"])),
+                 "fallback": self._absolute(default_storage.url(size["fallback"]))}
+                for size in (item.image_variants or {}).get("sizes", [])]
+
+    def get_url(self, item):
+        return self._absolute(item.get_absolute_url())
+
+
+class QuantitySerializer(serializers.Serializer):
+    quantity = serializers.IntegerField(min_value=0, max_value=99)
+
+
+class CartQuantitySerializer(QuantitySerializer):
+    slug = serializers.SlugField()
+
+
+class CartBatchSerializer(serializers.Serializer):
+    """Пакет изменений корзины: quantity = 0 удаляет позицию"""
+    items = CartQuantitySerializer(many=True, allow_empty=False, max_length=100)
+
+
+class CartLineSerializer(serializers.Serializer):
+    slug = serializers.CharField()
+    quantity = serializers.IntegerField()
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
+    tax_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    total_with_taxes = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class CartSummarySerializer(serializers.Serializer):
+    total_quantity = serializers.IntegerField()
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2)
+    tax_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    total_with_taxes = serializers.DecimalField(max_digits=12, decimal_places=2)
+    currency = serializers.CharField(source="currency.code", default=None)
+    has_multiple_currencies = serializers.BooleanField()
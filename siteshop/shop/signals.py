@@ -0,0 +1,150 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_version
+from .cart import merge_guest_cart
+from .images import sync_variants
+from .models import Category, Currency, Discount, Item, RankCategory, Tax
+from .utils import currency_table, rank_table
+
+
+def _recount_items(category_id):
+    """Полный пересчёт счётчика (для загрузки фикстур, где нет прежнего состояния)"""
+    if category_id:
+        Category.objects.filter(pk=category_id).refresh_items_count()
+        bump_version("categories")
+
+
+def _change_items_count(category_id, delta):
+    if category_id and delta:
+        Category.objects.filter(pk=category_id).update(
+            items_count=F("items_count") + delta)
+        bump_version("categories")
+
+
+@receiver(pre_save, sender=Item)
+def remember_item_state(sender, instance, raw, **kwargs):
+    """Запомнить категорию и доступность товара до сохранения"""
+    instance._previous_state = None
+    if instance.pk and not raw:
+        instance._previous_state = Item.objects.filter(pk=instance.pk).values(
+            "category_id", "is_available").first()
+
+
+@receiver(post_save, sender=Item)
+def update_category_counter_on_save(sender, instance, created, raw, **kwargs):
+    if raw:
+        _recount_items(instance.category_id)
+        return
+    previous = getattr(instance, "_previous_state", None)
+    before = (previous["category_id"], previous["is_available"]) if previous else (None, False)
+    after = (instance.category_id, instance.is_available)
+    if before == after:
+        return
+    if before[1]:
+        _change_items_count(before[0], -1)
+    if after[1]:
+        _change_items_count(after[0], 1)
+
+
+@receiver(post_delete, sender=Item)
+def update_category_counter_on_delete(sender, instance, **kwargs):
+    if instance.is_available:
+        _change_items_count(instance.category_id, -1)
+
+
+@receiver(post_save, sender=Item)
+def update_item_search_vector(sender, instance, **kwargs):
+    Item.objects.filter(pk=instance.pk).update_search_vector()
+
+
+@receiver(post_save, sender=Item)
+def update_item_image_variants(sender, instance, raw, **kwargs):
+    """Миниатюры и WebP-варианты при загрузке нового изображения"""
+    if not raw:
+        sync_variants(instance, "image", "image_variants")
+
+
+@receiver(m2m_changed, sender=Item.taxes.through)
+def update_item_tax_profile(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Налоговый профиль товара при изменении набора налогов (с любой стороны связи).
+    refresh_tax_profile пишет через bulk_update без сигналов, поэтому версия каталога
+    увеличивается здесь (после фиксации транзакции, см. bump_version).
+    """
+    if reverse and action == "pre_clear":
+        instance._cleared_item_ids = list(instance.items.values_list("pk", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        Item.objects.filter(pk=instance.pk).refresh_tax_profile()
+    elif action == "post_clear":
+        Item.objects.filter(pk__in=getattr(instance, "_cleared_item_ids", [])).refresh_tax_profile()
+    else:
+        Item.objects.filter(pk__in=pk_set).refresh_tax_profile()
+    bump_version("catalog")
+
+
+@receiver(post_save, sender=Tax)
+def update_tax_profiles_on_tax_save(sender, instance, raw, **kwargs):
+    if not raw:
+        Item.objects.filter(taxes=instance).refresh_tax_profile()
+
+
+@receiver(pre_delete, sender=Tax)
+def remember_taxed_items(sender, instance, **kwargs):
+    instance._taxed_item_ids = list(instance.items.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Tax)
+def update_tax_profiles_on_tax_delete(sender, instance, **kwargs):
+    Item.objects.filter(pk__in=getattr(instance, "_taxed_item_ids", [])).refresh_tax_profile()
+
+
+@receiver(post_save, sender=Category)
+def invalidate_categories_on_save(sender, instance, raw, **kwargs):
+    if raw:
+        _recount_items(instance.pk)
+    Item.objects.filter(category=instance).update_search_vector()
+    bump_version("categories")
+
+
+@receiver(post_delete, sender=Category)
+def invalidate_categories_on_delete(sender, **kwargs):
+    bump_version("categories")
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Currency)
+@receiver(post_delete, sender=Currency)
+@receiver(post_save, sender=Tax)
+@receiver(post_delete, sender=Tax)
+def invalidate_catalog(sender, **kwargs):
+    """Любое изменение каталога делает закэшированные страницы неактуальными"""
+    bump_version("catalog")
+
+
+@receiver(post_save, sender=Currency)
+@receiver(post_delete, sender=Currency)
+def invalidate_currency_table(sender, **kwargs):
+    currency_table.invalidate()
+
+
+@receiver(post_save, sender=RankCategory)
+@receiver(post_delete, sender=RankCategory)
+@receiver(post_save, sender=Discount)
+@receiver(post_delete, sender=Discount)
+def invalidate_rank_table(sender, **kwargs):
+    rank_table.invalidate()
+
+
+@receiver(user_logged_in)
+def merge_guest_cart_on_login(sender, request, user, **kwargs):
+    if request is not None:
+        merge_guest_cart(request, user)
@@ -1,301 +1,174 @@
 document.addEventListener('DOMContentLoaded', function() {
-    console.log('Cart JS loaded');
-    
-    // Функция для преобразования строки с запятой в число
-    function parseEuropeanNumber(str) {
-        if (!str) return 0;
-        
-        // Заменяем запятую на точку и убираем пробелы
-        const cleanStr = str.toString()
-            .replace(/\./g, '')  // убираем точки как разделители тысяч
-            .replace(/,/g, '.')  // заменяем запятую на точку
-            .replace(/\s/g, ''); // убираем пробелы
-        
-        return parseFloat(cleanStr) || 0;
-    }
-    
+    const cartPage = document.querySelector('.cart-page');
+    if (!cartPage) return;
+
+    const cartApiUrl = cartPage.dataset.cartApi;
+    const cartTotalElement = document.getElementById('cart-total');
+    const cartTaxElement = document.getElementById('cart-tax');
+    const totalQuantityElement = document.getElementById('total-quantity');
+    const cartCurrency = cartTotalElement ? cartTotalElement.dataset.currency : '';
+
+    // Задержка перед отправкой количества: несколько кликов по +/- дают один запрос
+    const UPDATE_DELAY = 300;
+    const updateTimers = new WeakMap();
+
     // Функция для форматирования числа в европейский формат
     function formatEuropeanNumber(num) {
-        return num.toFixed(2).replace('.', ',');
+        return parseFloat(num).toFixed(2).replace('.', ',');
     }
-    
-    // Вспомогательные функции для точных вычислений с деньгами
-    function multiplyMoney(price, quantity) {
-        // Преобразуем в центы и работаем с целыми числами
-        const priceInCents = Math.round(price * 100);
-        const totalInCents = priceInCents * quantity;
-        return totalInCents / 100;
+
+    function getCsrfToken() {
+        const input = document.querySelector('[name=csrfmiddlewaretoken]');
+        return input ? input.value : '';
     }
-    
-    function sumMoney(numbers) {
-        // Суммируем с точностью до центов
-        let totalInCents = 0;
-        numbers.forEach(num => {
-            totalInCents += Math.round(num * 100);
+
+    // 1. Запрос к JSON API корзины: в ответе изменённая строка и итоги
+    async function cartRequest(url, method, body) {
+        const response = await fetch(url, {
+            method: method,
+            credentials: 'same-origin',
+            headers: {
+                'Accept': 'application/json',
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCsrfToken()
+            },
+            body: body ? JSON.stringify(body) : undefined
         });
-        return totalInCents / 100;
+        if (!response.ok) {
+            throw new Error(`Ошибка корзины: ${response.status}`);
+        }
+        return response.json();
     }
-    
-    // 1. Храним оригинальные данные корзины
-    let originalCartTotal = 0;
-    let cartCurrency = '';
-    
-    // Получаем элементы
-    const cartTotalElement = document.getElementById('cart-total');
-    const totalQuantityElement = document.getElementById('total-quantity');
-    
-    // Получаем валюту из data-атрибута
-    if (cartTotalElement && cartTotalElement.dataset.currency) {
-        cartCurrency = cartTotalElement.dataset.currency;
-        originalCartTotal = parseEuropeanNumber(cartTotalElement.dataset.originalTotal);
-    } else if (cartTotalElement) {
-        // Если нет data-атрибутов, пробуем парсить текст
-        const totalText = cartTotalElement.textContent.trim();
-        const parts = totalText.split(' ');
-        
-        if (parts.length >= 2) {
-            originalCartTotal = parseEuropeanNumber(parts[0]);
-            cartCurrency = parts.slice(1).join(' '); // Берем все после первого пробела
+
+    // 2. Обновление итогов корзины из ответа сервера
+    function renderSummary(summary) {
+        if (totalQuantityElement) {
+            totalQuantityElement.textContent = `${summary.total_quantity} шт.`;
+        }
+        if (cartTotalElement) {
+            cartTotalElement.textContent = `${formatEuropeanNumber(summary.total_price)} ${cartCurrency}`;
+        }
+        if (cartTaxElement) {
+            cartTaxElement.textContent = `${formatEuropeanNumber(summary.tax_amount)} ${cartCurrency}`;
+        }
+        if (summary.total_quantity === 0) {
+            showEmptyCart();
         }
     }
-    
-    console.log('Original cart total:', originalCartTotal, 'Currency:', cartCurrency);
-    
-    // 2. Собираем данные о товарах
-    const cartItems = [];
-    
-    document.querySelectorAll('.cart-item-card').forEach(card => {
+
+    // 3. Обновление строки товара
+    function renderLine(card, line) {
         const input = card.querySelector('.qty-input');
         const totalElement = card.querySelector('.total-price');
-        
-        // Получаем цену из data-атрибута, преобразуя запятую в точку
-        const priceText = card.dataset.itemPrice || '';
-        const price = parseEuropeanNumber(priceText);
-        
-        const currency = card.dataset.itemCurrency || '';
-        
-        // Парсим текущую сумму товара
-        const totalText = totalElement.textContent.trim();
-        const parts = totalText.split(' ');
-        let originalItemTotal = 0;
-        let itemCurrency = currency;
-        
-        if (parts.length >= 2) {
-            originalItemTotal = parseEuropeanNumber(parts[0]);
-            // Если currency из data-атрибута пустая, берем из текста
-            if (!itemCurrency) {
-                itemCurrency = parts.slice(1).join(' ');
-            }
-        }
-        
-        // Сохраняем данные
-        cartItems.push({
-            card: card,
-            price: price,  // цена товара (например 9.99)
-            currency: itemCurrency,
-            originalQuantity: parseInt(input.value) || 1,
-            currentQuantity: parseInt(input.value) || 1,
-            input: input,
-            totalElement: totalElement,
-            originalTotal: originalItemTotal
-        });
-        
-        // Сохраняем оригинальное значение
-        input.dataset.originalValue = input.value;
-    });
-    
-    // 3. Функция для обновления суммы товара с точностью
-    function updateItemTotal(cartItem) {
-        // Используем точное умножение через центы
-        const itemTotal = multiplyMoney(cartItem.price, cartItem.currentQuantity);
-        // Форматируем в европейский формат с запятой
-        cartItem.totalElement.textContent = `${formatEuropeanNumber(itemTotal)} ${cartItem.currency}`;
-        return itemTotal;
+        input.value = line.quantity;
+        totalElement.textContent = `${formatEuropeanNumber(line.total)} ${card.dataset.itemCurrency}`;
+        updateButtonState(input, line.quantity <= 1, line.quantity >= 99);
     }
-    
-    // 4. Функция для обновления общей суммы корзины с точностью
-    function updateCartTotal() {
-        if (!cartTotalElement || !cartCurrency) return;
-        
-        // Собираем суммы всех товаров
-        const itemTotals = [];
-        cartItems.forEach(item => {
-            const itemTotal = multiplyMoney(item.price, item.currentQuantity);
-            itemTotals.push(itemTotal);
-        });
-        
-        // Суммируем с точностью
-        const totalSum = sumMoney(itemTotals);
-        
-        // Форматируем в европейский формат с запятой
-        cartTotalElement.textContent = `${formatEuropeanNumber(totalSum)} ${cartCurrency}`;
-    }
-    
-    // 5. Функция для обновления общего количества
-    function updateTotalQuantity() {
-        if (!totalQuantityElement) return;
-        
-        let totalQuantity = 0;
-        
-        // Суммируем количество всех товаров
-        cartItems.forEach(item => {
-            totalQuantity += item.currentQuantity;
-        });
-        
-        // Обновляем отображение
-        totalQuantityElement.textContent = `${totalQuantity} шт.`;
+
+    function showEmptyCart() {
+        const content = cartPage.querySelector('.cart-content');
+        const emptyCart = cartPage.querySelector('.empty-cart');
+        if (content) content.remove();
+        if (emptyCart) emptyCart.style.display = '';
     }
-    
-    // 6. Функция для изменения количества
-    function handleQuantityChange(button, change) {
-        const form = button.closest('.update-quantity-form');
-        const input = form.querySelector('.qty-input');
-        const card = button.closest('.cart-item-card');
-        
-        // Находим товар
-        const cartItem = cartItems.find(item => item.card === card);
-        if (!cartItem) return;
-        
-        let newQuantity = cartItem.currentQuantity + change;
-        
-        // Проверяем границы
-        if (newQuantity < 1) {
-            updateButtonState(input, true, false);
-            return;
-        }
-        if (newQuantity > 99) {
-            updateButtonState(input, false, true);
-            return;
-        }
-        
-        // Обновляем данные
-        input.value = newQuantity;
-        cartItem.currentQuantity = newQuantity;
-        
-        // Обновляем сумму товара (с точностью)
-        updateItemTotal(cartItem);
-        
-        // Обновляем общие значения (с точностью)
-        updateCartTotal();
-        updateTotalQuantity();
-        
-        // Показываем кнопку "Обновить"
-        showUpdateButton(form);
-        
-        // Обновляем состояние кнопок
-        updateButtonState(input, newQuantity <= 1, newQuantity >= 99);
+
+    // 4. Отправка нового количества; при ошибке - обычная отправка формы
+    function scheduleUpdate(card, quantity) {
+        clearTimeout(updateTimers.get(card));
+        updateTimers.set(card, setTimeout(async function() {
+            try {
+                const data = await cartRequest(card.dataset.apiUrl, 'PATCH', {quantity: quantity});
+                if (data.line) renderLine(card, data.line);
+                renderSummary(data.summary);
+            } catch (error) {
+                card.querySelector('.update-quantity-form').submit();
+            }
+        }, UPDATE_DELAY));
     }
-    
-    // 7. Функция для обновления состояния кнопок +/-
+
+    // 5. Функция для обновления состояния кнопок +/-
     function updateButtonState(input, isMinDisabled, isPlusDisabled) {
         const minusBtn = input.parentElement.querySelector('.minus');
         const plusBtn = input.parentElement.querySelector('.plus');
-        
+
         if (minusBtn) {
             minusBtn.style.opacity = isMinDisabled ? '0.5' : '1';
             minusBtn.style.cursor = isMinDisabled ? 'not-allowed' : 'pointer';
             minusBtn.disabled = isMinDisabled;
         }
-        
+
         if (plusBtn) {
             plusBtn.style.opacity = isPlusDisabled ? '0.5' : '1';
             plusBtn.style.cursor = isPlusDisabled ? 'not-allowed' : 'pointer';
             plusBtn.disabled = isPlusDisabled;
         }
     }
-    
-    // 8. Показать кнопку 
-    function showUpdateButton(form) {
-        const updateBtn = form.querySelector('.update-btn');
-        if (updateBtn && updateBtn.style.display === 'none') {
-            updateBtn.style.display = 'inline-block';
-            updateBtn.style.backgroundColor = '#28a745'; 
-            updateBtn.style.color = 'white'; 
-        }
+
+    function changeQuantity(input, quantity) {
+        quantity = Math.min(Math.max(quantity, 1), 99);
+        input.value = quantity;
+        updateButtonState(input, quantity <= 1, quantity >= 99);
+        scheduleUpdate(input.closest('.cart-item-card'), quantity);
     }
-    
-    // 9. Обработчики для кнопок +/-
+
+    // 6. Обработчики для кнопок +/- и поля количества
     document.querySelectorAll('.qty-btn.minus').forEach(btn => {
         btn.addEventListener('click', function() {
-            handleQuantityChange(this, -1);
+            const input = this.parentElement.querySelector('.qty-input');
+            changeQuantity(input, (parseInt(input.value) || 1) - 1);
         });
     });
-    
+
     document.querySelectorAll('.qty-btn.plus').forEach(btn => {
         btn.addEventListener('click', function() {
-            handleQuantityChange(this, 1);
+            const input = this.parentElement.querySelector('.qty-input');
+            changeQuantity(input, (parseInt(input.value) || 1) + 1);
         });
     });
-    
-    // 10. Обработчик для стрелочек input[type=number]
+
     document.querySelectorAll('.qty-input').forEach(input => {
-        const card = input.closest('.cart-item-card');
-        const cartItem = cartItems.find(item => item.input === input);
-        
-        input.addEventListener('input', function() {
-            const form = this.closest('.update-quantity-form');
-            let newQuantity = parseInt(this.value) || 1;
-            
-            // Проверяем границы
-            if (newQuantity < 1) {
-                this.value = 1;
-                newQuantity = 1;
-            }
-            if (newQuantity > 99) {
-                this.value = 99;
-                newQuantity = 99;
-            }
-            
-            if (cartItem) {
-                cartItem.currentQuantity = newQuantity;
-                
-                // Обновляем сумму товара (с точностью)
-                updateItemTotal(cartItem);
-                
-                // Обновляем общие значения (с точностью)
-                updateCartTotal();
-                updateTotalQuantity();
-                
-                // Показываем кнопку если значение изменилось
-                if (this.value !== this.dataset.originalValue) {
-                    showUpdateButton(form);
-                }
-                
-                // Обновляем состояние кнопок
-                updateButtonState(this, newQuantity <= 1, newQuantity >= 99);
+        input.addEventListener('change', function() {
+            changeQuantity(this, parseInt(this.value) || 1);
+        });
+    });
+
+    // 7. Удаление товара без перезагрузки страницы
+    document.querySelectorAll('.remove-form').forEach(form => {
+        form.addEventListener('submit', async function(e) {
+            e.preventDefault();
+            const card = form.closest('.cart-item-card');
+            try {
+                const data = await cartRequest(card.dataset.apiUrl, 'DELETE');
+                card.remove();
+                renderSummary(data.summary);
+            } catch (error) {
+                form.submit();
             }
         });
     });
-    
-    // 11. Кнопка оформления заказа
-    const checkoutBtn = document.getElementById('checkout-btn');
-    if (checkoutBtn && !checkoutBtn.disabled) {
-        checkoutBtn.addEventListener('click', function(e) {
-            // Проверяем есть ли несохраненные изменения
-            const unsavedForms = Array.from(document.querySelectorAll('.update-quantity-form'))
-                .filter(form => {
-                    const updateBtn = form.querySelector('.update-btn');
-                    return updateBtn && updateBtn.style.display !== 'none';
-                });
-            
-            if (unsavedForms.length > 0) {
-                e.preventDefault();
-                if (confirm('У вас есть несохраненные изменения. Сохранить перед оформлением заказа?')) {
-                    unsavedForms.forEach(form => form.submit());
-                }
+
+    // 8. Очистка корзины
+    const clearForm = document.querySelector('.clear-cart-form');
+    if (clearForm) {
+        clearForm.addEventListener('submit', async function(e) {
+            e.preventDefault();
+            try {
+                const data = await cartRequest(cartApiUrl, 'DELETE');
+                renderSummary(data.summary);
+            } catch (error) {
+                clearForm.submit();
             }
         });
     }
-    
-    // 12. Скрываем кнопки "Обновить" при загрузке
+
+    // 9. Кнопки "Подтвердить" не нужны: количество сохраняется сразу
     document.querySelectorAll('.update-btn').forEach(btn => {
         btn.style.display = 'none';
     });
-    
-    // 13. Инициализируем состояние всех кнопок
+
+    // 10. Инициализируем состояние всех кнопок
     document.querySelectorAll('.qty-input').forEach(input => {
         const quantity = parseInt(input.value) || 1;
         updateButtonState(input, quantity <= 1, quantity >= 99);
     });
-    
-});
\ No newline at end of file
+});
@@ -0,0 +1,219 @@
+import random
+import threading
+import time
+import uuid
+from functools import reduce
+
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from .cache import get_counters, incr_counter
+
+# Операции Stripe, которые вызывает магазин: "сервис.метод" клиента StripeClient.v1
+OPERATIONS = (
+    "checkout.sessions.create",
+    "checkout.sessions.retrieve",
+    "payment_intents.create",
+    "payment_intents.retrieve",
+    "tax_rates.create",
+    "tax_rates.update",
+    "tax_rates.list",
+    "coupons.create",
+    "coupons.update",
+    "coupons.delete",
+    "coupons.list",
+)
+READ_METHODS = ("retrieve", "list")
+
+
+class StripeUnavailableError(stripe.APIConnectionError):
+    """Автомат отключения разомкнут: Stripe не вызывается до конца паузы"""
+
+
+class CircuitBreaker:
+    """
+    После threshold подряд неудачных (сетевых или 5xx) вызовов размыкается на cooldown секунд.
+    Затем пропускает один пробный вызов: успех замыкает его, неудача снова размыкает.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def release(self):
+        """Вызов прервался не из-за Stripe: пробный вызов не засчитывается ни в успех, ни в сбой"""
+        with self._lock:
+            self.probing = False
+
+    def failure(self):
+        """True, если этот сбой разомкнул автомат"""
+        with self._lock:
+            self.failures += 1
+            self.probing = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+
+def is_retryable(error):
+    """Повторяются только сбои сети, 429 и ошибки сервера Stripe"""
+    if isinstance(error, (stripe.APIConnectionError, stripe.RateLimitError)):
+        return True
+    return isinstance(error, stripe.StripeError) and (error.http_status or 0) >= 500
+
+
+class StripeGateway:
+    """
+    Единая точка вызова Stripe: общий пул HTTP-соединений, таймаут на операцию,
+    ограниченные повторы с джиттером, ключи идемпотентности для записи,
+    автомат отключения и счётчики вызовов/ошибок/задержки.
+    """
+
+    def __init__(self):
+        self._session = None
+        self._clients = {}
+        self._lock = threading.Lock()
+        self.breaker = CircuitBreaker(settings.STRIPE_BREAKER_THRESHOLD,
+                                      settings.STRIPE_BREAKER_COOLDOWN)
+
+    def _build_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=settings.STRIPE_POOL_SIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def client(self, timeout):
+        """Клиент на каждый таймаут; все клиенты используют один пул соединений"""
+        client = self._clients.get(timeout)
+        if client is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._build_session()
+                client = self._clients.get(timeout)
+                if client is None:
+                    base = {"api": settings.STRIPE_API_BASE} if settings.STRIPE_API_BASE else None
+                    client = stripe.StripeClient(
+                        settings.STRIPE_API_SECRET_KEY,
+                        base_addresses=base,
+                        max_network_retries=0,
+                        http_client=stripe.RequestsClient(
+                            timeout=(settings.STRIPE_CONNECT_TIMEOUT, timeout), session=self._session),
+                    )
+                    self._clients[timeout] = client
+        return client
+
+    @staticmethod
+    def timeout(operation):
+        timeouts = settings.STRIPE_TIMEOUTS
+        return timeouts.get(operation, timeouts["default"])
+
+    def call(self, operation, *args, params=None, idempotency_key=None):
+        """
+        Выполнить операцию из OPERATIONS, например
+        gateway.call("payment_intents.retrieve", pi_id) или
+        gateway.call("coupons.create", params={...}).
+        Для записи ключ идемпотентности создаётся один раз и повторяется во всех попытках.
+        """
+        *path, method = operation.split(".")
+        options = {}
+        if method not in READ_METHODS:
+            options["idempotency_key"] = idempotency_key or f"siteshop-{uuid.uuid4()}"
+        if params is not None:
+            params = {key: value for key, value in params.items() if value is not None}
+
+        started = time.monotonic()
+        attempt = 0
+        try:
+            while True:
+                if not self.breaker.allow():
+                    raise StripeUnavailableError("Stripe временно недоступен, повторите позже")
+                service = reduce(getattr, path, self.client(self.timeout(operation)).v1)
+                try:
+                    result = getattr(service, method)(*args, params=params, options=options)
+                except stripe.StripeError as e:
+                    if not is_retryable(e):
+                        self.breaker.success()
+                        raise
+                    if self.breaker.failure():
+                        incr_counter("stripe_breaker_opened")
+                    delay = self.backoff(attempt)
+                    if (attempt >= settings.STRIPE_MAX_RETRIES
+                            or time.monotonic() - started + delay > settings.STRIPE_RETRY_BUDGET):
+                        raise
+                    attempt += 1
+                    incr_counter(f"stripe_{operation}_retries")
+                    time.sleep(delay)
+                    continue
+                except BaseException:
+                    self.breaker.release()
+                    raise
+                self.breaker.success()
+                return result
+        except stripe.StripeError:
+            incr_counter(f"stripe_{operation}_errors")
+            raise
+        finally:
+            incr_counter(f"stripe_{operation}_calls")
+            incr_counter(f"stripe_{operation}_latency_ms",
+                         int((time.monotonic() - started) * 1000))
+
+    @staticmethod
+    def backoff(attempt):
+        """Экспоненциальная пауза с полным джиттером"""
+        ceiling = min(settings.STRIPE_RETRY_MAX_DELAY, settings.STRIPE_RETRY_BASE_DELAY * 2 ** attempt)
+        return random.uniform(0, ceiling)
+
+    def metrics(self):
+        names = [f"stripe_{operation}_{kind}" for operation in OPERATIONS
+                 for kind in ("calls", "errors", "retries", "latency_ms")]
+        counters = get_counters("stripe_breaker_opened", *names)
+        operations = {}
+        for operation in OPERATIONS:
+            calls = counters[f"stripe_{operation}_calls"]
+            if not calls:
+                continue
+            operations[operation] = {
+                "calls": calls,
+                "errors": counters[f"stripe_{operation}_errors"],
+                "retries": counters[f"stripe_{operation}_retries"],
+                "avg_latency_ms": round(counters[f"stripe_{operation}_latency_ms"] / calls, 1),
+            }
+        return {
+            "breaker": self.breaker.state,
+            "breaker_opened": counters["stripe_breaker_opened"],
+            "operations": operations,
+        }
+
+
+gateway = StripeGateway()
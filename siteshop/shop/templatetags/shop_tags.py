@@ -1,20 +1,66 @@
 import random
 from django import template
-from shop.models import Category
-from django.db.models import Count
+from django.conf import settings
+from django.db.models import Max, Min
+from shop.models import Category, Item
+from shop.cache import get_or_set
+from shop.images import picture_html
 
 register = template.Library()
 
 
 @register.inclusion_tag('shop/categories.html')
 def show_categories(category_selected=0):
-    categories = Category.objects.filter(items__is_available=True).annotate(
-        total=Count("items")).filter(total__gt=0).order_by("name")
+    categories = get_or_set("categories", ["sidebar"], lambda: list(
+        Category.objects.filter(items_count__gt=0).order_by("name")))
     return {'categories': categories, 'category_selected': category_selected}
 
 
+def build_featured_pool(size, category_id=0):
+    """
+    Пул товаров с изображениями для карусели (на странице категории - только из неё).
+    Берётся окно из size товаров, начиная со случайного id,
+    поэтому стоимость не зависит от размера каталога.
+    """
+    items = Item.published.exclude(image="")
+    if category_id:
+        items = items.filter(category_id=category_id)
+    bounds = items.aggregate(low=Min("id"), high=Max("id"))
+    if bounds["low"] is None:
+        return []
+
+    pivot = random.randint(bounds["low"], bounds["high"])
+    window = list(items.filter(id__gte=pivot).order_by("id").only(
+        "slug", "image", "image_variants")[:size])
+    if len(window) < size:
+        window += items.filter(id__lt=pivot).order_by("id").only(
+            "slug", "image", "image_variants")[:size - len(window)]
+
+    return [{"url": item.get_absolute_url(), "image": item.image.url,
+             "variants": item.image_variants} for item in window]
+
+
+@register.simple_tag
+def featured_items(category_id=0):
+    """
+    Случайная выборка из пула карусели, пул обновляется раз в FEATURED_POOL_TTL.
+    category_id - категория страницы (0 - весь каталог), у каждой свой пул.
+    """
+    pool = get_or_set(
+        "catalog", ["featured_pool", category_id or 0],
+        lambda: build_featured_pool(settings.FEATURED_POOL_SIZE, category_id),
+        settings.FEATURED_POOL_TTL,
+    )
+    return random.sample(pool, min(settings.FEATURED_SAMPLE_SIZE, len(pool)))
+
+
 @register.simple_tag
-def shuffled_items(items):
-    tmp = list(items)[:]
-    random.shuffle(tmp)
-    return tmp
+def picture(image, variants=None, default="", sizes="100vw", **attrs):
+    """
+    Изображение с вариантами из srcset.
+    image - файл модели или готовый URL, default - URL заглушки.
+    """
+    if not image:
+        return picture_html(default, sizes=sizes, **attrs)
+    url = getattr(image, "url", image)
+    return picture_html(url, variants, sizes=sizes, **attrs)
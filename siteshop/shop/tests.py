@@ -0,0 +1,253 @@
+from decimal import Decimal
+from itertools import count
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache as default_cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import cache
+from .models import (Cart, Category, Currency, DataVersion, Discount, Item, Order,
+                     RankCategory, StripeEvent, Tax)
+from .cart import get_cart_badge
+from .forms import CatalogFilterForm
+from .pagination import KeysetPaginator
+from .pricing import get_cart_summary
+from .stripe_gateway import CircuitBreaker, StripeGateway, gateway
+from .utils import currency_table, rank_table
+from .webhooks import process_event
+
+stripe_ids = count(1)
+
+
+def fake_stripe_call(operation, *args, params=None, idempotency_key=None):
+    """Ответ Stripe без сети: у объекта есть id, url и client_secret"""
+    object_id = f"{operation.split('.')[0]}_{next(stripe_ids)}"
+    return SimpleNamespace(id=object_id, url=f"https://checkout.stripe.test/{object_id}",
+                           client_secret=f"{object_id}_secret")
+
+
+# Версии кэша не перечитываются между прогревом и замером
+@override_settings(CACHE_VERSION_LOCAL_TTL=60)
+@mock.patch.object(gateway, "call", side_effect=fake_stripe_call)
+class CartQueryCountTests(TestCase):
+    """Число запросов для корзины и оформления заказа не зависит от числа позиций"""
+    LINES = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        with mock.patch.object(gateway, "call", side_effect=fake_stripe_call):
+            cls.user = get_user_model().objects.create_user("buyer", password="password")
+            currency = Currency.objects.create(
+                code="rub", symbol="₽", name="Рубль", rate_to_rub=1, min_amount=50)
+            category = Category.objects.create(name="Игрушки", slug="toys")
+            taxes = [Tax.objects.create(display_name="НДС", percentage=Decimal("20.00")),
+                     Tax.objects.create(display_name="Сбор", percentage=Decimal("1.50"))]
+            discount = Discount.objects.create(name="Новичок", percent_off=Decimal("5.00"),
+                                               duration="forever")
+            RankCategory.objects.create(name="Новичок", min_total=0, discount=discount)
+            cls.items = []
+            for number in range(cls.LINES):
+                item = Item.objects.create(
+                    name=f"Товар {number}", price=Decimal("100.00") + number,
+                    description="Описание", owner=cls.user, category=category,
+                    currency=currency, slug=f"item-{number}")
+                item.taxes.set(taxes)
+                cls.items.append(item)
+
+    def setUp(self):
+        default_cache.clear()
+        cache._local_versions.clear()
+        currency_table.invalidate()
+        rank_table.invalidate()
+        self.client.force_login(self.user)
+
+    def fill_cart(self, lines):
+        cart = Cart.objects.for_user(self.user)
+        cart.clear()
+        cart.set_quantities({item.pk: 2 for item in self.items[:lines]})
+        return cart
+
+    def count_queries(self, func):
+        # Первый вызов прогревает версии кэша и справочники процесса
+        func()
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return len(queries)
+
+    def assertSameQueries(self, func, expected):
+        counts = {}
+        for lines in (1, self.LINES):
+            self.fill_cart(lines)
+            counts[lines] = self.count_queries(func)
+        self.assertEqual(counts, {1: expected, self.LINES: expected})
+
+    def test_cart_summary(self, call):
+        for lines in (1, self.LINES):
+            cart = self.fill_cart(lines)
+            with self.assertNumQueries(1):
+                summary = get_cart_summary(cart)
+            self.assertEqual(len(summary), lines)
+
+    def test_cart_badge(self, call):
+        self.fill_cart(2)
+        request = SimpleNamespace(user=self.user, session={})
+        self.assertEqual(get_cart_badge(request)["count"], 4)
+        with self.assertNumQueries(0):
+            badge = get_cart_badge(request)
+        self.assertEqual(badge["total"], Decimal("402.00"))
+        # Корзину меняет другой процесс: новая версия приходит с пользователем
+        self.fill_cart(1)
+        request.user = get_user_model().objects.get(pk=self.user.pk)
+        self.assertEqual(get_cart_badge(request)["count"], 2)
+
+    def test_view_cart(self, call):
+        self.assertSameQueries(lambda: self.client.get(reverse("view_cart")), 4)
+
+    def test_create_session_cart(self, call):
+        def checkout():
+            response = self.client.post(reverse("create_session_cart"))
+            self.assertTrue(response.url.startswith("https://checkout.stripe.test/"))
+        self.assertSameQueries(checkout, 8)
+
+    def test_payment_intent(self, call):
+        def checkout():
+            response = self.client.post(reverse("create_payment_intent_cart"))
+            self.assertEqual(response.status_code, 200)
+        self.assertSameQueries(checkout, 8)
+
+
+class SearchTests(TestCase):
+    def test_empty_query(self):
+        for query in ("", " "):
+            response = self.client.get(reverse("search"), {"q": query})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(list(response.context["items"]), [])
+
+
+class WebhookTests(TestCase):
+    def test_event_before_order_is_retried(self):
+        user = get_user_model().objects.create_user("payer", password="password")
+        currency = Currency.objects.create(
+            code="rub", symbol="₽", name="Рубль", rate_to_rub=1, min_amount=50)
+        currency_table.invalidate()
+        event = StripeEvent.objects.create(
+            event_id="evt_1", type="payment_intent.succeeded", object_id="pi_1",
+            payload={"data": {"object": {"id": "pi_1"}}},
+            status=StripeEvent.PROCESSING, attempts=1)
+        # Событие пришло раньше, чем создан заказ: оно возвращается в очередь
+        self.assertFalse(process_event(event))
+        event.refresh_from_db()
+        self.assertEqual(event.status, StripeEvent.PENDING)
+
+        order = Order.objects.create(user=user, stripe_payment_intent_id="pi_1",
+                                     total_amount=Decimal("100.00"), currency=currency)
+        self.assertTrue(process_event(event))
+        order.refresh_from_db()
+        self.assertEqual(order.status, "Paid")
+
+
+@mock.patch.object(gateway, "call", side_effect=fake_stripe_call)
+class CatalogVersionTests(TestCase):
+    def test_item_taxes_change_bumps_catalog(self, call):
+        user = get_user_model().objects.create_user("seller", password="password")
+        currency = Currency.objects.create(
+            code="rub", symbol="₽", name="Рубль", rate_to_rub=1, min_amount=50)
+        item = Item.objects.create(name="Товар", price=Decimal("100.00"), description="Описание",
+                                   owner=user, currency=currency, slug="item")
+        tax = Tax.objects.create(display_name="НДС", percentage=Decimal("20.00"))
+        version = DataVersion.objects.current("catalog")[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            item.taxes.add(tax)
+        self.assertEqual(DataVersion.objects.current("catalog")[0], version + 1)
+
+    @override_settings(CACHE_VERSION_LOCAL_TTL=60)
+    def test_modified_is_memoized(self, call):
+        cache._local_versions.clear()
+        modified = cache.get_modified("catalog")
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get_modified("catalog"), modified)
+            cache.get_version("catalog")
+
+
+class CircuitBreakerTests(TestCase):
+    def test_probe_released_after_foreign_error(self):
+        breaker = CircuitBreaker(threshold=1, cooldown=0)
+        breaker.failure()
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.release()
+        self.assertTrue(breaker.allow())
+
+    @override_settings(STRIPE_API_SECRET_KEY="sk_test")
+    def test_gateway_releases_probe(self):
+        stripe_gateway = StripeGateway()
+        stripe_gateway.breaker = CircuitBreaker(threshold=1, cooldown=0)
+        stripe_gateway.breaker.failure()
+        client = mock.Mock()
+        client.v1.coupons.list.side_effect = RuntimeError("сбой клиента")
+        with mock.patch.object(stripe_gateway, "client", return_value=client):
+            with self.assertRaises(RuntimeError):
+                stripe_gateway.call("coupons.list")
+        self.assertFalse(stripe_gateway.breaker.probing)
+
+
+@mock.patch.object(gateway, "call", side_effect=fake_stripe_call)
+class KeysetPaginatorTests(TestCase):
+    def test_decimal_cursor(self, call):
+        user = get_user_model().objects.create_user("seller", password="password")
+        currency = Currency.objects.create(
+            code="rub", symbol="₽", name="Рубль", rate_to_rub=1, min_amount=50)
+        for number in range(5):
+            Item.objects.create(name=f"Товар {number}", price=Decimal("100.50") + number % 2,
+                                description="Описание", owner=user, currency=currency,
+                                slug=f"item-{number}")
+        paginator = KeysetPaginator(("-price", "id"), per_page=2)
+        seen, cursor = [], None
+        while True:
+            page = paginator.paginate(Item.objects.all(), cursor)
+            seen.extend(item.pk for item in page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        expected = Item.objects.order_by("-price", "id").values_list("pk", flat=True)
+        self.assertEqual(seen, list(expected))
+
+
+@mock.patch.object(gateway, "call", side_effect=fake_stripe_call)
+class CatalogFilterTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user("seller", password="password")
+        self.rub = Currency.objects.create(
+            code="rub", symbol="₽", name="Рубль", rate_to_rub=1, min_amount=50)
+        self.usd = Currency.objects.create(
+            code="usd", symbol="$", name="Доллар", rate_to_rub=90, min_amount=Decimal("0.5"))
+        currency_table.invalidate()
+        self.items = {}
+        for currency, price in ((self.rub, "500"), (self.rub, "600"), (self.usd, "500")):
+            self.items[currency.code, price] = Item.objects.create(
+                name=f"Товар {currency.code} {price}", price=Decimal(price), description="Описание",
+                owner=user, currency=currency, slug=f"item-{currency.code}-{price}")
+
+    def filtered(self, params):
+        queryset = Item.objects.all()
+        for condition in CatalogFilterForm(params).get_filters().values():
+            queryset = queryset.filter(condition)
+        return set(queryset)
+
+    def test_price_max_is_inclusive_and_in_default_currency(self, call):
+        self.assertEqual(self.filtered({"price_max": "500"}), {self.items["rub", "500"]})
+
+    def test_price_in_selected_currency(self, call):
+        self.assertEqual(self.filtered({"price_max": "500", "currency": "usd"}),
+                         {self.items["usd", "500"]})
+
+    def test_price_range_is_half_open(self, call):
+        # Диапазон 0 - [0, 500): граница 500 относится к следующему диапазону
+        self.assertEqual(self.filtered({"price_range": "0"}), set())
+        self.assertEqual(self.filtered({"price_range": "1"}),
+                         {self.items["rub", "500"], self.items["rub", "600"]})
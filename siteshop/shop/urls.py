@@ -6,6 +6,7 @@ urlpatterns = [
     path('', views.PeopleHome.as_view(), name='home'),
     path('category/<slug:cat_slug>/',
          views.ShopCategory.as_view(), name='category'),
+    path('search/', views.SearchItems.as_view(), name='search'),
     path('item/<slug:item_slug>/', views.ShowItem.as_view(), name='item'),
     path('item/<slug:slug>/edit/', views.UpdateItem.as_view(), name='edit_item'),
     path('add_item/', views.AddItem.as_view(), name='add_item'),
@@ -17,8 +18,17 @@ urlpatterns = [
          views.create_session_success, name='create_session_success'),
     path('api/v1/tax-rates/', views.stripe_tax_rates, name='tax-rates'),
     path('api/v1/coupons/', views.stripe_coupons, name='coupons'),
+    path('api/v1/metrics/', views.metrics, name='metrics'),
+    path('api/v1/items/', views.ItemListApi.as_view(), name='api-items'),
+    path('api/v1/items/<slug:item_slug>/',
+         views.ItemDetailApi.as_view(), name='api-item'),
+    path('api/v1/categories/', views.CategoryListApi.as_view(), name='api-categories'),
     path('cart/', views.view_cart, name='view_cart'),
     path('cart/clear/', views.clear_cart, name='clear_cart'),
+    path('api/v1/cart/', views.cart_api, name='cart_api'),
+    path('api/v1/cart/batch/', views.cart_batch_update, name='cart_batch_update'),
+    path('api/v1/cart/items/<slug:item_slug>/',
+         views.cart_item_api, name='cart_item_api'),
     path('buy/cart/', views.create_session_cart, name='create_session_cart'),
     path('item/<slug:item_slug>/add-to-cart/',
          views.add_to_cart, name='add_to_cart'),
@@ -30,4 +40,5 @@ urlpatterns = [
          name='create_payment_intent_cart'),
     path('payment-intent/success/', views.payment_intent_success,
          name='payment_intent_success'),
+    path('stripe/webhook/', views.stripe_webhook, name='stripe_webhook'),
 ]
@@ -1,29 +1,162 @@
+import threading
+from bisect import bisect_right
+import time
+from collections.abc import Mapping
+from decimal import Decimal
+
+from django.conf import settings
 from django.utils.functional import lazy
+from .money import Money
+
+
+class CurrencyInfo:
+    __slots__ = ("pk", "code", "symbol", "rate_to_rub", "min_amount", "is_active")
+
+    def __init__(self, pk, code, symbol, rate_to_rub, min_amount, is_active):
+        self.pk = pk
+        self.code = code
+        self.symbol = symbol
+        self.rate_to_rub = rate_to_rub
+        self.min_amount = min_amount
+        self.is_active = is_active
+
+
+class LocalTable:
+    """
+    Небольшая справочная таблица в памяти процесса: загружается одним запросом,
+    живёт ttl_setting секунд и сбрасывается сигналом при изменении исходных моделей.
+    """
+    ttl_setting = "CURRENCY_TABLE_TTL"
+
+    def __init__(self):
+        self._rows = None
+        self._expires = 0
+        self._lock = threading.Lock()
+
+    def rows(self):
+        rows = self._rows
+        if rows is None or time.monotonic() >= self._expires:
+            with self._lock:
+                if self._rows is None or time.monotonic() >= self._expires:
+                    self._rows = self._load()
+                    self._expires = time.monotonic() + getattr(settings, self.ttl_setting)
+                rows = self._rows
+        return rows
+
+    def _load(self):
+        raise NotImplementedError
+
+    def invalidate(self):
+        self._rows = None
+
+
+class CurrencyTable(LocalTable):
+    """Валюты: {код: курс, минимальная сумма, символ}"""
+
+    def _load(self):
+        from .models import Currency
+        return {
+            code.lower(): CurrencyInfo(pk, code.lower(), symbol, rate, min_amount, is_active)
+            for pk, code, symbol, rate, min_amount, is_active in Currency.objects.values_list(
+                "pk", "code", "symbol", "rate_to_rub", "min_amount", "is_active")
+        }
+
+    def get(self, code):
+        return self.rows().get((code or "").lower())
+
+    def by_id(self, pk):
+        return next((info for info in self.rows().values() if info.pk == pk), None)
+
+    def active(self):
+        return [info for info in self.rows().values() if info.is_active]
+
+    def to_rubles(self, amount, code):
+        """Сумма в рублях (Decimal до копеек); 0 для неизвестной валюты"""
+        return self.to_rubles_many([(amount, code)])[0]
+
+    def to_rubles_many(self, amounts):
+        """Пакетная конвертация [(сумма, код валюты)] -> [рубли] без обращений к БД"""
+        rows = self.rows()
+        result = []
+        for amount, code in amounts:
+            info = rows.get((code or "").lower())
+            if info is None:
+                result.append(Decimal(0))
+            elif info.code == "rub":
+                result.append(Decimal(amount))
+            else:
+                result.append(Money.from_decimal(Decimal(amount) * info.rate_to_rub, "rub").amount)
+        return result
+
+    def total_in_rubles(self, amounts):
+        return sum(self.to_rubles_many(amounts), Decimal(0))
+
+
+currency_table = CurrencyTable()
+
+
+class RankTable(LocalTable):
+    """
+    Ранги по возрастанию min_total вместе с купонами.
+    Текущий и следующий ранг ищутся двоичным поиском по порогам.
+    """
+    ttl_setting = "RANK_TABLE_TTL"
+
+    def _load(self):
+        from .models import RankCategory
+        ranks = list(RankCategory.objects.select_related("discount").order_by("min_total", "pk"))
+        return [rank.min_total for rank in ranks], ranks
+
+    def current(self, total):
+        """Старший ранг с min_total <= total или None"""
+        thresholds, ranks = self.rows()
+        index = bisect_right(thresholds, total)
+        return ranks[index - 1] if index else None
+
+    def next(self, total):
+        """Первый ранг с min_total > total или None"""
+        thresholds, ranks = self.rows()
+        index = bisect_right(thresholds, total)
+        return ranks[index] if index < len(ranks) else None
+
+
+rank_table = RankTable()
+
+
+class MinAmounts(Mapping):
+    """Минимальные суммы Stripe в минимальных единицах по коду активной валюты"""
+
+    def __getitem__(self, code):
+        info = currency_table.get(code)
+        if info is None or not info.is_active:
+            raise KeyError(code)
+        return Money.from_decimal(info.min_amount, info.code).minor
+
+    def __iter__(self):
+        return (info.code for info in currency_table.active())
+
+    def __len__(self):
+        return len(currency_table.active())
 
 
 def get_currency_choices():
     """Получить выборку валют из модели Currency"""
-    from .models import Currency
-    currencies = Currency.objects.filter(is_active=True).order_by('code')
-    return [(currency.code.lower(), currency.symbol) for currency in currencies]
+    return [(info.code, info.symbol) for info in sorted(currency_table.active(), key=lambda info: info.code)]
 
 
 def get_min_amounts():
     """Получить минимальные суммы для Stripe"""
-    from .models import Currency
-    currencies = Currency.objects.filter(is_active=True)
-    return {
-        currency.code.lower(): int(float(currency.min_amount) * 100)
-        for currency in currencies
-    }
+    return dict(MIN_AMOUNTS)
 
 
 def get_stripe_min_amount(currency_code):
     """Получить минимальную сумму для конкретной валюты в минимальных единицах"""
-    from .models import Currency
-    currency = Currency.objects.get(code__iexact=currency_code)
-    return int(float(currency.min_amount) * 100)
+    info = currency_table.get(currency_code)
+    if info is None:
+        from .models import Currency
+        raise Currency.DoesNotExist(currency_code)
+    return Money.from_decimal(info.min_amount, info.code).minor
 
 
 CURRENCY_CHOICES = lazy(get_currency_choices, list)()
-MIN_AMOUNTS = lazy(get_min_amounts, list)()
+MIN_AMOUNTS = MinAmounts()
@@ -4,10 +4,32 @@ from django.urls import reverse, reverse_lazy
 from django.views.generic import ListView, DetailView, UpdateView, CreateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from siteshop import settings
-from .models import CartItem, Item, Cart, Order, OrderItem, RankCategory
-from .mixins import UserOwnerMixin
+from .models import CartItem, Category, Item, Cart, Order, OrderItem, StripeEvent, Tax
+from .mixins import (AnonymousPageCacheMixin, CatalogApiCacheMixin, CatalogFilterMixin,
+                     KeysetPaginationMixin, SparseFieldsetMixin, UserOwnerMixin)
+from .pagination import KeysetApiPagination
+from .serializers import (CartBatchSerializer, CartLineSerializer, CartSummarySerializer,
+                          CategorySerializer, ItemSerializer, QuantitySerializer)
+from .authentication import CsrfSessionAuthentication
+from .money import Money, basis_points
+from .pricing import create_order_items
+from .cart import get_cart
+from .stripe_gateway import gateway
+from .utils import rank_table
+from .webhooks import record_event
+from django.db.models import Prefetch, Value
+from rest_framework import generics
+from .cache import get_counters, get_modified, get_version, is_page_cacheable
+import hashlib
+import json
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition, require_POST
+from django.http import HttpResponse
 import stripe
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from datetime import datetime, timezone
 from rest_framework.decorators import api_view
@@ -19,7 +41,57 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 
 
-class PeopleHome(ListView):
+def catalog_etag(request, *args, **kwargs):
+    """Валидатор страниц каталога: версия каталога и адрес страницы"""
+    if not is_page_cacheable(request):
+        return None
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f"catalog-{get_version('catalog')}-{path}"
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    if not is_page_cacheable(request):
+        return None
+    return get_modified("catalog")
+
+
+def _item_updated_at(request, item_slug):
+    if not hasattr(request, "_item_updated_at"):
+        request._item_updated_at = Item.published.filter(
+            slug=item_slug).values_list("updated_at", flat=True).first()
+    return request._item_updated_at
+
+
+def item_etag(request, item_slug):
+    """Валидатор страницы товара: дата изменения товара и версия каталога"""
+    if not is_page_cacheable(request):
+        return None
+    updated_at = _item_updated_at(request, item_slug)
+    if updated_at is None:
+        return None
+    return f"item-{item_slug}-{updated_at.timestamp()}-{get_version('catalog')}"
+
+
+def item_last_modified(request, item_slug):
+    if not is_page_cacheable(request):
+        return None
+    updated_at = _item_updated_at(request, item_slug)
+    if updated_at is None:
+        return None
+    return max(updated_at, get_modified("catalog"))
+
+
+def data_etag(data):
+    """Валидатор для ответов API: хэш зеркалируемых данных"""
+    return hashlib.md5(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+catalog_condition = method_decorator(
+    condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified), name="dispatch")
+
+
+@catalog_condition
+class PeopleHome(AnonymousPageCacheMixin, CatalogFilterMixin, KeysetPaginationMixin, ListView):
     model = Item
     template_name = "shop/index.html"
     context_object_name = "items"
@@ -27,27 +99,50 @@ class PeopleHome(ListView):
                      "default_image": settings.DEFAULT_ITEM_IMAGE}
 
     def get_queryset(self):
-        return Item.published.all().select_related("category")
+        return self.filter_queryset(Item.published.cards())
 
 
-class ShopCategory(ListView):
+@catalog_condition
+class ShopCategory(AnonymousPageCacheMixin, CatalogFilterMixin, KeysetPaginationMixin, ListView):
     template_name = 'shop/index.html'
     context_object_name = "items"
-    allow_empty = False
 
     def get_queryset(self):
-        return Item.published.filter(category__slug=self.kwargs["cat_slug"]).select_related("category")
+        self.filter_category = get_object_or_404(Category, slug=self.kwargs["cat_slug"])
+        return self.filter_queryset(Item.published.cards())
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        category = context["items"][0].category
-        context['category_selected'] = category.pk
-        context['title'] = "Категория - " + category.name
+        context['category_selected'] = self.filter_category.pk
+        context['title'] = "Категория - " + self.filter_category.name
         context['default_image'] = settings.DEFAULT_ITEM_IMAGE
         return context
 
 
-class ShowItem(DetailView):
+@catalog_condition
+class SearchItems(AnonymousPageCacheMixin, KeysetPaginationMixin, ListView):
+    template_name = 'shop/index.html'
+    context_object_name = "items"
+    paginate_ordering = ("-rank", "id")
+
+    def get_queryset(self):
+        self.query = self.request.GET.get("q", "").strip()
+        if not self.query:
+            # Пустая выдача, но с полем rank: по нему сортирует пагинация
+            return Item.objects.none().annotate(rank=Value(0))
+        return Item.published.search(self.query).cards()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['title'] = "Поиск - " + self.query
+        context['search_query'] = self.query
+        context['category_selected'] = 0
+        context['default_image'] = settings.DEFAULT_ITEM_IMAGE
+        return context
+
+
+@method_decorator(condition(etag_func=item_etag, last_modified_func=item_last_modified), name="dispatch")
+class ShowItem(AnonymousPageCacheMixin, DetailView):
     model = Item
     template_name = 'shop/item.html'
     slug_url_kwarg = "item_slug"
@@ -69,6 +164,10 @@ class ShowItem(DetailView):
             if cart_item:
                 context['item_in_cart'] = True
                 context['cart_quantity'] = cart_item.quantity
+        else:
+            quantity = self.request.guest_cart.get_quantity(context['item'])
+            context['item_in_cart'] = quantity > 0
+            context['cart_quantity'] = quantity
 
         return context
 
@@ -125,26 +224,24 @@ class DeletePage(LoginRequiredMixin, UserOwnerMixin, DeleteView):
 @login_required
 def create_session_item(request, item_slug):
     item = get_object_or_404(Item, slug=item_slug, is_available=True)
-    taxes = item.taxes.all()
+    taxes = item.tax_profile.get("ids", [])
     total_spent = request.user.get_total_spent()
-    current_rank = RankCategory.objects.filter(
-        min_total__lte=total_spent
-    ).order_by('-min_total').first()
+    current_rank = rank_table.current(total_spent)
     discount = current_rank.discount
     coupon = discount.stripe_coupon_id if discount.is_active else None
 
     try:
-        session = stripe.checkout.Session.create(
+        session = gateway.call("checkout.sessions.create", params=dict(
             line_items=[{
                 'price_data': {
                     'currency': item.currency.code,
                     'product_data': {
                         'name': item.name,
                     },
-                    'unit_amount': int(item.price * 100),
+                    'unit_amount': Money.from_decimal(item.price, item.currency.code).stripe_amount,
                 },
                 'quantity': 1,
-                'tax_rates': [tax.stripe_tax_id for tax in taxes]
+                'tax_rates': item.tax_profile.get("stripe_ids", [])
             }],
             mode='payment',
             success_url=request.build_absolute_uri(
@@ -152,7 +249,7 @@ def create_session_item(request, item_slug):
             ) + '?session_id={CHECKOUT_SESSION_ID}',
             discounts=[
                 {'coupon': f"{current_rank.discount.stripe_coupon_id}"}] if coupon else None
-        )
+        ))
 
         order = Order.objects.create(
             user=request.user,
@@ -193,8 +290,8 @@ def stripe_tax_rates(request):
     starting_after = request.GET.get('starting_after')
     ending_before = request.GET.get('ending_before')
     try:
-        tax_rates = stripe.TaxRate.list(
-            limit=limit, starting_after=starting_after, ending_before=ending_before)
+        tax_rates = gateway.call("tax_rates.list", params=dict(
+            limit=limit, starting_after=starting_after, ending_before=ending_before))
 
         for tax_rate in tax_rates:
             dt_object = datetime.fromtimestamp(
@@ -202,7 +299,12 @@ def stripe_tax_rates(request):
             tax_rate["created_UTC"] = dt_object.strftime(
                 '%Y-%m-%d %H:%M:%S UTC')
 
-        return Response({'data': tax_rates.data, "count": len(tax_rates)})
+        data = {'data': tax_rates.data, "count": len(tax_rates)}
+        etag = quote_etag(data_etag(data))
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        return Response(data, headers={"ETag": etag})
     except stripe.error.StripeError as e:
         return Response({'error': str(e)}, status=400)
 
@@ -220,8 +322,8 @@ def stripe_coupons(request):
     starting_after = request.GET.get('starting_after')
     ending_before = request.GET.get('ending_before')
     try:
-        tax_rates = stripe.Coupon.list(
-            limit=limit, starting_after=starting_after, ending_before=ending_before)
+        tax_rates = gateway.call("coupons.list", params=dict(
+            limit=limit, starting_after=starting_after, ending_before=ending_before))
 
         for tax_rate in tax_rates:
             dt_object = datetime.fromtimestamp(
@@ -229,80 +331,131 @@ def stripe_coupons(request):
             tax_rate["created_UTC"] = dt_object.strftime(
                 '%Y-%m-%d %H:%M:%S UTC')
 
-        return Response({'data': tax_rates.data, "count": len(tax_rates)})
+        data = {'data': tax_rates.data, "count": len(tax_rates)}
+        etag = quote_etag(data_etag(data))
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        return Response(data, headers={"ETag": etag})
     except stripe.error.StripeError as e:
         return Response({'error': str(e)}, status=400)
 
 
-@login_required
-def view_cart(request):
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.select_related('item').all()
-    total_price_without_taxes = cart.get_total_price()
-    tax_amount = cart.get_tax_amount()
-    total_quantity = cart.get_total_quantity()
+class ItemApiMixin(SparseFieldsetMixin):
+    serializer_class = ItemSerializer
+
+    def get_queryset(self):
+        """Связи подгружаются только для запрошенных полей, search_vector не читается"""
+        fields = self.get_requested_fields() or ItemSerializer.Meta.fields
+        queryset = Item.published.defer("search_vector")
+        related = [ItemSerializer.RELATED_FIELDS[name]
+                   for name in fields if name in ItemSerializer.RELATED_FIELDS]
+        if related:
+            queryset = queryset.select_related(*related)
+        if "taxes" in fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                "taxes", queryset=Tax.objects.only("display_name", "percentage", "inclusive")))
+        return queryset
+
+
+class ItemListApi(CatalogApiCacheMixin, ItemApiMixin, generics.ListAPIView):
+    """
+    Список товаров.
+    GET-параметры:
+    cursor - курсор следующей страницы (из поля next)
+    page_size = 20 (по умолчанию, не больше 100)
+    fields - список полей через запятую
+    category - slug категории
+    """
+    pagination_class = KeysetApiPagination
+    paginate_ordering = ("-created_at", "id")
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        category = self.request.query_params.get("category")
+        if category:
+            queryset = queryset.filter(category__slug=category)
+        return queryset
+
+
+class ItemDetailApi(CatalogApiCacheMixin, ItemApiMixin, generics.RetrieveAPIView):
+    lookup_field = "slug"
+    lookup_url_kwarg = "item_slug"
+
+
+class CategoryListApi(CatalogApiCacheMixin, SparseFieldsetMixin, generics.ListAPIView):
+    serializer_class = CategorySerializer
+    pagination_class = KeysetApiPagination
+    paginate_ordering = ("name", "id")
+    queryset = Category.objects.all()
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    """
+    Счётчики кэша страниц, вызовов Stripe и очереди событий (только для администраторов).
+    Счётчики кэша и Stripe относятся к процессу, обслужившему запрос; очередь - общая.
+    """
+    counters = get_counters("page_cache_hits", "page_cache_misses")
+    requests_total = counters["page_cache_hits"] + counters["page_cache_misses"]
+    return Response({
+        "page_cache": {
+            "hits": counters["page_cache_hits"],
+            "misses": counters["page_cache_misses"],
+            "hit_ratio": round(counters["page_cache_hits"] / requests_total, 4) if requests_total else 0,
+        },
+        "stripe": gateway.metrics(),
+        "stripe_events": StripeEvent.objects.backlog(),
+    })
+
 
-    currencies = set(cart_item.item.currency for cart_item in cart_items)
+def view_cart(request):
+    cart = get_cart(request)
+    summary = cart.get_summary()
 
     context = {
         'cart': cart,
-        'cart_items': cart_items,
-        "total_price": total_price_without_taxes,
-        "tax_amount": tax_amount,
-        "total_quantity": total_quantity,
+        'cart_items': summary.lines,
+        "total_price": summary.total_price,
+        "tax_amount": summary.tax_amount,
+        "total_quantity": summary.total_quantity,
         'title': 'Корзина',
-        'has_multiple_currencies': len(currencies) > 1,
-        'currencies': currencies,
+        'has_multiple_currencies': summary.has_multiple_currencies,
+        'currencies': summary.currencies,
         "default_image": settings.DEFAULT_ITEM_IMAGE,
     }
 
     return render(request, 'shop/cart.html', context)
 
 
-@login_required
 def clear_cart(request):
     if request.method == 'POST':
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        cart.items.all().delete()
+        get_cart(request).clear()
     return redirect('view_cart')
 
 
-@login_required
 def add_to_cart(request, item_slug):
     item = get_object_or_404(Item, slug=item_slug, is_available=True)
-    cart, created = Cart.objects.get_or_create(user=request.user)
+    cart = get_cart(request)
     form = AddToCartForm(request.POST)
 
     if form.is_valid():
         quantity = form.cleaned_data['quantity']
 
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            item=item,
-            defaults={'quantity': quantity}
-        )
-
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
+        if not cart.add(item, quantity):
+            messages.error(
+                request, f"В корзине может быть не больше {settings.GUEST_CART_MAX_LINES} товаров")
 
     return redirect('item', item_slug=item_slug)
 
 
-@login_required
 def remove_from_cart(request, item_slug):
     item = get_object_or_404(Item, slug=item_slug)
-
-    cart = Cart.objects.get(user=request.user)
-    if cart:
-        cart_item = cart.items.get(item=item)
-        if cart_item:
-            cart_item.delete()
-
+    get_cart(request).remove(item)
     return redirect('view_cart')
 
 
-@login_required
 def update_cart_item(request, item_slug):
     item = get_object_or_404(Item, slug=item_slug)
 
@@ -310,44 +463,96 @@ def update_cart_item(request, item_slug):
 
     if form.is_valid():
         quantity = form.cleaned_data['quantity']
+        get_cart(request).set_quantity(item, quantity)
 
-        cart = Cart.objects.filter(user=request.user).first()
-        if cart:
-            cart_item = cart.items.filter(item=item).first()
-            if cart_item:
-                if quantity > 0:
-                    cart_item.quantity = quantity
-                    cart_item.save()
+    return redirect('view_cart')
 
-                else:
-                    cart_item.delete()
 
-    return redirect('view_cart')
+@api_view(['POST'])
+@authentication_classes([CsrfSessionAuthentication])
+def cart_batch_update(request):
+    """
+    Пакетное изменение корзины в одной транзакции.
+    Тело: {"items": [{"slug": "...", "quantity": 2}, ...]}, quantity = 0 удаляет позицию.
+    """
+    serializer = CartBatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    changes = {row["slug"]: row["quantity"] for row in serializer.validated_data["items"]}
+
+    items = {slug: (pk, is_available) for slug, pk, is_available in Item.objects.filter(
+        slug__in=changes).values_list("slug", "pk", "is_available")}
+    unknown = [slug for slug in changes if slug not in items]
+    unavailable = [slug for slug, quantity in changes.items()
+                   if slug in items and quantity > 0 and not items[slug][1]]
+    if unknown or unavailable:
+        return Response({"unknown": unknown, "unavailable": unavailable}, status=400)
+
+    cart = get_cart(request)
+    cart.set_quantities({items[slug][0]: quantity for slug, quantity in changes.items()})
+    return Response(CartSummarySerializer(cart.get_summary()).data)
+
+
+def cart_response(cart, item=None):
+    """Ответ JSON API корзины: изменённая строка и пересчитанные итоги"""
+    summary = cart.get_summary()
+    line = next((line for line in summary if item is not None and line.item.pk == item.pk), None)
+    return Response({
+        "line": CartLineSerializer(line).data if line else None,
+        "summary": CartSummarySerializer(summary).data,
+    })
+
+
+@api_view(['GET', 'DELETE'])
+@authentication_classes([CsrfSessionAuthentication])
+def cart_api(request):
+    """GET - итоги корзины, DELETE - очистить корзину"""
+    cart = get_cart(request)
+    if request.method == 'DELETE':
+        cart.clear()
+    return cart_response(cart)
+
+
+@api_view(['POST', 'PATCH', 'DELETE'])
+@authentication_classes([CsrfSessionAuthentication])
+def cart_item_api(request, item_slug):
+    """
+    POST {"quantity": n} - добавить n шт.
+    PATCH {"quantity": n} - установить количество
+    DELETE - убрать товар из корзины
+    """
+    cart = get_cart(request)
+    if request.method == 'DELETE':
+        item = get_object_or_404(Item, slug=item_slug)
+        cart.remove(item)
+        return cart_response(cart)
+
+    item = get_object_or_404(Item, slug=item_slug, is_available=True)
+    serializer = QuantitySerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    quantity = serializer.validated_data["quantity"]
+    if request.method == 'POST':
+        if quantity < 1:
+            return Response({"quantity": ["Минимальное количество: 1"]}, status=400)
+        if not cart.add(item, quantity):
+            return Response(
+                {"detail": f"В корзине может быть не больше {settings.GUEST_CART_MAX_LINES} товаров"},
+                status=400)
+    else:
+        cart.set_quantity(item, quantity)
+    return cart_response(cart, item)
 
 
 @login_required
 def create_session_success(request):
+    """Страница после Checkout: статус заказа выставляет вебхук, здесь только чтение из БД"""
     session_id = request.GET.get('session_id')
 
     if session_id:
-        try:
-            session = stripe.checkout.Session.retrieve(session_id)
-
-            order = Order.objects.get(
-                stripe_session_id=session.id,
-                user=request.user
-            )
-
-            if session.payment_status == 'paid':
-                order.status = 'Paid'
-                order.save()
-
-                Cart.objects.get(user=request.user).items.all().delete()
-
-            return render(request, 'shop/success.html', {'order': order})
-
-        except Exception as e:
-            return render(request, 'home', {'error': 'Ошибка платежной системы'})
+        order = Order.objects.filter(stripe_session_id=session_id, user=request.user).first()
+        if order is None:
+            messages.warning(request, "Заказ не найден в системе")
+            return redirect('view_cart')
+        return render(request, 'shop/success.html', {'order': order})
 
     return render(request, 'shop/success.html')
 
@@ -355,19 +560,16 @@ def create_session_success(request):
 @login_required
 def create_session_cart(request):
     cart = get_object_or_404(Cart, user=request.user)
+    summary = cart.get_summary()
 
-    if cart.is_empty():
+    if summary.is_empty():
         return redirect('view_cart')
 
-    items = cart.items.select_related('item').all()
-
-    currencies = set(item.item.currency for item in items)
-    if len(currencies) > 1:
+    if summary.has_multiple_currencies:
         return redirect('view_cart')
 
-    unavailable_items = items.filter(item__is_available=False)
-    if unavailable_items.exists():
-        item_names = [item.item.name for item in unavailable_items]
+    if summary.unavailable:
+        item_names = [line.name for line in summary.unavailable]
         messages.error(
             request,
             f"Следующие товары больше не доступны: {', '.join(item_names)}"
@@ -375,26 +577,24 @@ def create_session_cart(request):
         return redirect('view_cart')
 
     total_spent = request.user.get_total_spent()
-    current_rank = RankCategory.objects.filter(
-        min_total__lte=total_spent
-    ).order_by('-min_total').first()
+    current_rank = rank_table.current(total_spent)
     discount = current_rank.discount
     coupon = discount.stripe_coupon_id if discount.is_active else None
 
-    currency = items[0].item.currency
+    currency = summary.currency
     try:
-        session = stripe.checkout.Session.create(
+        session = gateway.call("checkout.sessions.create", params=dict(
             line_items=[
                 {
                     'price_data': {
-                        'currency': cart_item.item.currency.code,
-                        'product_data': {'name': cart_item.item.name},
-                        'unit_amount': int(cart_item.item.price * 100),
+                        'currency': line.item.currency.code,
+                        'product_data': {'name': line.name},
+                        'unit_amount': line.unit_price.stripe_amount,
                     },
-                    'quantity': cart_item.quantity,
-                    'tax_rates': [tax.stripe_tax_id for tax in cart_item.item.taxes.all()],
+                    'quantity': line.quantity,
+                    'tax_rates': line.stripe_tax_ids,
                 }
-                for cart_item in items
+                for line in summary
             ],
             mode='payment',
             success_url=request.build_absolute_uri(
@@ -402,25 +602,16 @@ def create_session_cart(request):
             ) + '?session_id={CHECKOUT_SESSION_ID}',
             discounts=[
                 {'coupon': f"{current_rank.discount.stripe_coupon_id}"}] if coupon else None
-        )
+        ))
 
         order = Order.objects.create(
             user=request.user,
             stripe_session_id=session.id,
-            total_amount=cart.get_total_price(),
+            total_amount=summary.total_price.amount,
             currency=currency,
             status='Unpaid'
         )
-
-        for cart_item in items:
-            OrderItem.objects.create(
-                order=order,
-                item=cart_item.item,
-                quantity=cart_item.quantity,
-                price=cart_item.item.price,
-                currency=cart_item.item.currency,
-                item_name=cart_item.item.name
-            ).taxes.set(cart_item.item.taxes.all())
+        create_order_items(order, summary)
 
         return redirect(session.url, code=303)
     except Exception as e:
@@ -431,101 +622,72 @@ def create_session_cart(request):
 
 @login_required
 def payment_intent_success(request):
-    """Страница успешной оплаты через PaymentIntent"""
+    """Страница успешной оплаты через PaymentIntent: данные заказа из БД, без запроса к Stripe"""
     payment_intent_id = request.GET.get('payment_intent')
 
     if not payment_intent_id:
         messages.warning(request, "Не указан идентификатор платежа")
         return redirect('view_cart')
 
-    try:
-        payment_intent = stripe.PaymentIntent.retrieve(payment_intent_id)
-
-        if payment_intent.status == 'succeeded':
-            try:
-                order = Order.objects.get(
-                    stripe_payment_intent_id=payment_intent_id)
-                order.status = 'Paid'
-                order.save()
-
-                Cart.objects.filter(user=request.user).delete()
-
-            except Order.DoesNotExist:
-                messages.warning(request, "Заказ не найден в системе")
-            except Cart.DoesNotExist:
-                pass
-
-        return render(request, 'shop/payment_success.html', {
-            'title': 'Оплата успешна',
-            'payment_intent': payment_intent,
-            'amount': payment_intent.amount / 100,
-            'currency': payment_intent.currency.upper(),
-        })
-
-    except stripe.error.InvalidRequestError:
-        messages.error(request, "Неверный идентификатор платежа")
-        return redirect('view_cart')
-    except Exception as e:
-        messages.error(request, f"Ошибка при обработке платежа: {str(e)}")
+    order = Order.objects.select_related('currency').filter(
+        stripe_payment_intent_id=payment_intent_id, user=request.user).first()
+    if order is None:
+        messages.warning(request, "Заказ не найден в системе")
         return redirect('view_cart')
 
+    return render(request, 'shop/payment_success.html', {
+        'title': 'Оплата успешна',
+        'order': order,
+        'payment_intent': {
+            'id': payment_intent_id,
+            'status': 'succeeded' if order.status == 'Paid' else 'processing',
+        },
+        'amount': order.total_amount,
+        'currency': order.currency.code.upper(),
+    })
+
+
+@csrf_exempt
+@require_POST
+def stripe_webhook(request):
+    """
+    Вебхук Stripe: проверка подписи и запись во входящую очередь, сразу 200.
+    Обработка - manage.py process_stripe_events; повторы отбрасываются по id.
+    """
+    try:
+        event = stripe.Webhook.construct_event(
+            request.body, request.headers.get('Stripe-Signature', ''),
+            settings.STRIPE_WEBHOOK_SECRET)
+    except (ValueError, stripe.error.SignatureVerificationError):
+        return HttpResponse(status=400)
+    record_event(json.loads(request.body))
+    return HttpResponse(status=200)
+
 
 @login_required
 def payment_intent(request):
     """Payment Intent"""
     try:
         cart = get_object_or_404(Cart, user=request.user)
+        summary = cart.get_summary()
 
-        if cart.is_empty():
+        if summary.is_empty():
             messages.info(request, "Корзина пуста")
             return redirect('view_cart')
 
-        cart_items = cart.items.select_related('item', 'item__currency').all()
-
-        currencies = set(item.item.currency for item in cart_items)
-        if len(currencies) > 1:
+        if summary.has_multiple_currencies:
             messages.error(request, "Товары в разных валютах")
             return redirect('view_cart')
 
-        currency = cart_items[0].item.currency
-
-        item_details = []
-        base_price_total = 0
-        tax_amount_total = 0
-
-        for cart_item in cart_items:
-            item = cart_item.item
-            quantity = cart_item.quantity
-            item_base_price = item.price * quantity
-            base_price_total += item_base_price
-
-            taxes = item.taxes.all()
-            item_tax = 0
-            if taxes.exists():
-                for tax in taxes:
-                    if not tax.inclusive:
-                        item_tax += item_base_price * (tax.percentage / 100)
-                tax_amount_total += item_tax
-
-            item_details.append({
-                'name': item.name,
-                'quantity': quantity,
-                'price': item.price,
-                'total': item_base_price,
-                'taxes': taxes,
-                'tax_amount': item_tax,
-                'image': item.image,
-                'slug': item.slug,
-            })
-
-        total_amount = base_price_total + tax_amount_total
+        currency = summary.currency
+        base_price_total = summary.total_price
+        tax_amount_total = summary.tax_amount
+        total_amount = summary.total_with_taxes
 
         total_spent = request.user.get_total_spent()
-        current_rank = RankCategory.objects.filter(
-            min_total__lte=total_spent
-        ).order_by('-min_total').first()
+        current_rank = rank_table.current(total_spent)
 
-        discount_amount = 0
+        discount_amount = Money.zero(currency.code)
         discount_percent = 0
         rank_name = None
 
@@ -533,45 +695,35 @@ def payment_intent(request):
             rank_name = current_rank.name
             if current_rank.discount.percent_off:
                 discount_percent = current_rank.discount.percent_off
-                discount_amount = total_amount * (discount_percent / 100)
+                discount_amount = total_amount.percent(basis_points(discount_percent))
                 total_amount -= discount_amount
             elif current_rank.discount.amount_off:
-                discount_amount = current_rank.discount.amount_off
+                discount_amount = Money.from_decimal(
+                    current_rank.discount.amount_off, currency.code)
                 total_amount -= discount_amount
 
-        payment_intent = stripe.PaymentIntent.create(
-            amount=int(total_amount * 100),
+        payment_intent = gateway.call("payment_intents.create", params=dict(
+            amount=total_amount.stripe_amount,
             currency=currency.code.lower(),
             automatic_payment_methods={"enabled": True},
             metadata={
                 "user_id": str(request.user.id),
-                "items_count": str(len(cart_items)),
+                "items_count": str(len(summary)),
                 "base_price": str(base_price_total),
                 "tax_amount": str(tax_amount_total),
                 "discount": str(discount_amount),
                 "rank": rank_name or "none",
             }
-        )
+        ))
 
         order = Order.objects.create(
             user=request.user,
             stripe_payment_intent_id=payment_intent.id,
-            total_amount=total_amount,
+            total_amount=total_amount.amount,
             currency=currency,
             status='Unpaid'
         )
-
-        for cart_item in cart_items:
-            order_item = OrderItem.objects.create(
-                order=order,
-                item=cart_item.item,
-                quantity=cart_item.quantity,
-                price=cart_item.item.price,
-                currency=cart_item.item.currency,
-                item_name=cart_item.item.name
-            )
-            if cart_item.item.taxes.exists():
-                order_item.taxes.set(cart_item.item.taxes.all())
+        create_order_items(order, summary)
 
         return render(request, 'shop/payment_intent.html', {
             'title': 'Оплата заказа',
@@ -579,8 +731,8 @@ def payment_intent(request):
             'client_secret': payment_intent.client_secret,
             'payment_intent_id': payment_intent.id,
             'order_id': order.id,
-            'items': item_details,
-            'items_count': len(cart_items),
+            'items': summary.lines,
+            'items_count': len(summary),
             'base_price_total': base_price_total,
             'tax_amount_total': tax_amount_total,
             'discount_amount': discount_amount,
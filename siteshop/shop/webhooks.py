@@ -0,0 +1,87 @@
+import traceback
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Cart, Order, StripeEvent
+
+HANDLERS = {}
+
+
+def handler(*event_types):
+    """Зарегистрировать обработчик объекта события для указанных типов"""
+    def register(func):
+        for event_type in event_types:
+            HANDLERS[event_type] = func
+        return func
+    return register
+
+
+def fulfil_order(order):
+    """Отметить заказ оплаченным и очистить корзину покупателя (один раз)"""
+    if not order.mark_paid():
+        return
+    cart = Cart.objects.filter(user_id=order.user_id).first()
+    if cart is not None:
+        cart.clear()
+
+
+# Заказ создаётся после ответа Stripe, и событие может прийти раньше него.
+# Тогда get() бросает Order.DoesNotExist и событие повторяется позже (см. process_event).
+@handler("checkout.session.completed", "checkout.session.async_payment_succeeded")
+def checkout_session_paid(session):
+    if session.get("payment_status") == "paid":
+        fulfil_order(Order.objects.get(stripe_session_id=session["id"]))
+
+
+@handler("payment_intent.succeeded")
+def payment_intent_succeeded(payment_intent):
+    fulfil_order(Order.objects.get(stripe_payment_intent_id=payment_intent["id"]))
+
+
+def record_event(event):
+    """
+    Положить проверенное событие во входящую очередь одним INSERT.
+    Повторная доставка того же события отбрасывается по уникальному id.
+    """
+    obj = event["data"]["object"]
+    created = event.get("created")
+    StripeEvent.objects.bulk_create([StripeEvent(
+        event_id=event["id"],
+        type=event["type"],
+        object_id=obj.get("id") or "",
+        payload=event,
+        stripe_created=datetime.fromtimestamp(created, tz=dt_timezone.utc) if created else None,
+    )], ignore_conflicts=True)
+
+
+def retry_delay(attempts):
+    """Пауза перед следующей попыткой: экспонента от числа попыток с потолком"""
+    return min(settings.STRIPE_EVENT_RETRY_MAX_DELAY,
+               settings.STRIPE_EVENT_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def process_event(event):
+    """
+    Обработать взятое в работу событие (см. StripeEventQuerySet.claim).
+    Обработчик и отметка о выполнении - в одной транзакции; при ошибке событие
+    возвращается в очередь с паузой, после STRIPE_EVENT_MAX_ATTEMPTS попыток - в dead.
+    """
+    events = StripeEvent.objects.filter(pk=event.pk)
+    try:
+        with transaction.atomic():
+            func = HANDLERS.get(event.type)
+            if func is not None:
+                func(event.payload["data"]["object"])
+            events.update(status=StripeEvent.DONE, processed_at=timezone.now(),
+                          locked_at=None, last_error="")
+    except Exception:
+        error = traceback.format_exc(limit=5)
+        if event.attempts >= settings.STRIPE_EVENT_MAX_ATTEMPTS:
+            events.update(status=StripeEvent.DEAD, locked_at=None, last_error=error)
+        else:
+            events.update(status=StripeEvent.PENDING, locked_at=None, last_error=error,
+                          available_at=timezone.now() + timedelta(seconds=retry_delay(event.attempts)))
+        return False
+    return True
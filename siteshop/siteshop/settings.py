@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     "shop.apps.ShopConfig",
     "users.apps.UsersConfig",
     'rest_framework',
@@ -49,6 +50,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'shop.middleware.GuestCartMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -65,6 +67,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'shop.context_processors.cart_badge',
             ],
         },
     },
@@ -123,6 +126,47 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# default - кэш страниц, API и фасетов в памяти процесса; ключи в нём содержат версию
+# набора данных, поэтому смена версии делает записи неактуальными во всех процессах.
+# Сами версии хранятся в БД (shop.models.DataVersion).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'siteshop',
+    },
+}
+# Сколько секунд процесс использует прочитанную версию, не обращаясь к БД
+CACHE_VERSION_LOCAL_TTL = 1
+
+# Время жизни версионированных записей кэша каталога (сек.)
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+# Карусель на главной: размер пула, время его жизни (сек.) и размер выборки
+FEATURED_POOL_SIZE = 40
+FEATURED_POOL_TTL = 5 * 60
+FEATURED_SAMPLE_SIZE = 10
+
+# Диапазоны цен для фасетов каталога: (от, до), None - без верхней границы
+CATALOG_PRICE_BUCKETS = [(0, 500), (500, 1000), (1000, 5000), (5000, None)]
+# Цены в разных валютах не сравниваются: без выбранной валюты фильтр по цене - в этой
+CATALOG_PRICE_CURRENCY = 'rub'
+
+# Поиск по товарам: конфигурация полнотекстового поиска PostgreSQL
+SEARCH_CONFIG = 'russian'
+
+# Гостевая корзина: подписанная cookie, срок жизни (сек.) и предел числа позиций
+GUEST_CART_COOKIE_NAME = 'cart'
+GUEST_CART_COOKIE_AGE = 30 * 24 * 60 * 60
+GUEST_CART_MAX_LINES = 50
+
+# Варианты изображений: ширины миниатюр (px) и качество WebP/JPEG
+IMAGE_VARIANT_WIDTHS = (100, 300, 600)
+IMAGE_VARIANT_QUALITY = 80
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
@@ -150,5 +194,41 @@ LOGIN_URL = "users:login"
 # Возьмите тестовые ключи в профиле Stripe
 STRIPE_API_SECRET_KEY = '<Ваш_секретный_ключ>'
 STRIPE_PUBLIC_KEY = '<Ваш_публичный_ключ>'
+# Секрет подписи вебхука (whsec_...): Dashboard -> Developers -> Webhooks или `stripe listen`
+STRIPE_WEBHOOK_SECRET = '<Ваш_секрет_вебхука>'
 
 stripe.api_key = STRIPE_API_SECRET_KEY
+
+# Вызовы Stripe идут через shop.stripe_gateway.
+# STRIPE_API_BASE - другой адрес API (например, локальная заглушка), None - api.stripe.com
+STRIPE_API_BASE = None
+# Пул HTTP-соединений и таймауты (сек.): подключение и ответ по операциям
+STRIPE_POOL_SIZE = 10
+STRIPE_CONNECT_TIMEOUT = 3
+STRIPE_TIMEOUTS = {
+    'default': 10,
+    'checkout.sessions.create': 15,
+    'payment_intents.create': 15,
+    'tax_rates.list': 5,
+    'coupons.list': 5,
+}
+# Повторы: не больше STRIPE_MAX_RETRIES и не дольше STRIPE_RETRY_BUDGET сек. на вызов
+STRIPE_MAX_RETRIES = 2
+STRIPE_RETRY_BASE_DELAY = 0.5
+STRIPE_RETRY_MAX_DELAY = 4
+STRIPE_RETRY_BUDGET = 20
+# Автомат отключения: число сбоев подряд и пауза (сек.)
+STRIPE_BREAKER_THRESHOLD = 5
+STRIPE_BREAKER_COOLDOWN = 30
+# Очередь событий вебхука (manage.py process_stripe_events): потоки обработки,
+# попытки до статуса dead, пауза перед повтором (сек., растёт вдвое) и её потолок,
+# через сколько сек. событие, взятое упавшим обработчиком, возвращается в очередь
+STRIPE_EVENT_WORKERS = 4
+STRIPE_EVENT_MAX_ATTEMPTS = 8
+STRIPE_EVENT_RETRY_DELAY = 10
+STRIPE_EVENT_RETRY_MAX_DELAY = 60 * 60
+STRIPE_EVENT_LOCK_TIMEOUT = 5 * 60
+
+# Справочники в памяти процесса: время жизни таблиц валют и рангов (сек.)
+CURRENCY_TABLE_TTL = 5 * 60
+RANK_TABLE_TTL = 5 * 60
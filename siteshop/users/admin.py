@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import User
-from django.utils.safestring import mark_safe
+from shop.images import picture_html
 
 
 @admin.register(User)
@@ -23,5 +23,5 @@ class UserAdmin(BaseUserAdmin):
     @admin.display(description='Изображение', ordering="content")
     def user_photo(self, user: User):
         if user.photo:
-            return mark_safe(f"<img src='{user.photo.url}' width=50>")
+            return picture_html(user.photo.url, user.photo_variants, sizes="50px", width=50)
         return "Без фото"
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 16:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_photo_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='cart_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Версия корзины'),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from decimal import Decimal
 from datetime import timedelta
 import uuid
 import bcrypt
@@ -14,10 +15,14 @@ from .validators import RussianValidator
 class User(AbstractUser):
     photo = models.ImageField(
         upload_to="users/%Y/%m/%d/", blank=True, null=True, verbose_name="Фото")
+    photo_variants = models.JSONField(
+        default=dict, blank=True, editable=False, verbose_name="Варианты фото")
     first_name = models.CharField(
         max_length=150, validators=[RussianValidator(),], verbose_name="Имя")
     last_name = models.CharField(
         max_length=150, validators=[RussianValidator(),], verbose_name="Фамилия")
+    cart_version = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Версия корзины")
 
     class Meta:
         verbose_name = "Пользователь"
@@ -25,15 +30,6 @@ class User(AbstractUser):
 
     def get_total_spent(self):
         """Сумма всех оплаченных заказов в рублях"""
-        from shop.models import Order, Currency
-
-        total_in_rubles = 0
-        paid_orders = Order.objects.filter(user=self, status='Paid')
-
-        for order in paid_orders:
-            total_in_rubles += Currency.convert_amount_to_rubles(
-                order.total_amount,
-                order.currency.code
-            )
-
-        return round(total_in_rubles, 2)
+        from shop.models import UserSpend
+        total = UserSpend.objects.filter(user=self).values_list('total_rub', flat=True).first()
+        return total if total is not None else Decimal(0)
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from shop.images import sync_variants
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def update_user_photo_variants(sender, instance, raw, **kwargs):
+    """Миниатюры и WebP-варианты при загрузке нового фото"""
+    if not raw:
+        sync_variants(instance, "photo", "photo_variants")
@@ -1,7 +1,8 @@
 from django.urls import reverse, reverse_lazy
 from django.views.generic import CreateView, UpdateView, DeleteView
 from siteshop import settings
-from shop.models import Currency, Item, Order, RankCategory
+from shop.models import Currency, Item, Order
+from shop.utils import rank_table
 from .forms import ProfileUserForm, RegisterUserForm, LoginForm
 from django.contrib.auth import get_user_model
 from django.forms.models import model_to_dict
@@ -55,19 +56,14 @@ class ProfileUser(UpdateView):
         context['items'] = user_items
 
         total_spent = user.get_total_spent()
-        current_rank = RankCategory.objects.filter(
-            min_total__lte=total_spent
-        ).order_by('-min_total').first()
+        current_rank = rank_table.current(total_spent)
 
         if current_rank:
-            next_rank = RankCategory.objects.filter(
-                min_total__gt=total_spent
-            ).order_by('min_total').first()
+            next_rank = rank_table.next(total_spent)
 
             if next_rank:
-                current_min, next_min = float(
-                    current_rank.min_total), float(next_rank.min_total)
-                progress = ((total_spent - current_min) / (next_min - current_min) * 100
+                current_min, next_min = current_rank.min_total, next_rank.min_total
+                progress = ((total_spent - current_min) * 100 / (next_min - current_min)
                             if (next_min - current_min) > 0 else 0)
                 context['rank_progress'] = {
                     'current_rank': current_rank,